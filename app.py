@@ -1,8 +1,18 @@
 import streamlit as st
 import googlemaps
-import pydeck as pdk
-import pandas as pd
-import urllib.parse
+from streamlit_searchbox import st_searchbox
+
+from autocomplete import DEBOUNCE_MS, PrefixCache, new_session_token, suggest
+from cache import open_geocode_cache, open_walk_cache
+from candidates import LETTERS
+from engine import CUISINE_OPTIONS, SEARCH_HEADROOM_MINS, AddressNotFound, coalesced_triangulate_stream
+from isochrones import IsochroneStore
+from metrics import DAILY_QUOTA, SearchMetrics, log_search, quota_burn
+from singleflight import SingleFlight
+from streetgraph import StreetGraph
+from throttle import make_client
+from venues import VenueIndex
+from warmup import PREFETCH_BUDGET, Warmup
 
 # --- Page Config ---
 st.set_page_config(
@@ -10,11 +20,69 @@ st.set_page_config(
     layout="wide"
 )
 
+# --- Shared Caches (one per server process, used by every session) ---
+@st.cache_resource
+def get_geocode_cache():
+    return open_geocode_cache()
+
+@st.cache_resource
+def get_walk_cache():
+    return open_walk_cache()
+
+@st.cache_resource
+def get_prefix_cache():
+    return PrefixCache()
+
+@st.cache_resource
+def get_maps_client(api_key):
+    # Shared rate limits, retries and connection pool for every session using this key
+    return make_client(api_key)
+
+@st.cache_resource
+def get_single_flight():
+    # Identical searches from different sessions share one run
+    return SingleFlight()
+
+@st.cache_resource
+def get_isochrone_store():
+    return IsochroneStore()
+
+@st.cache_resource
+def get_venue_index():
+    return VenueIndex()
+
+@st.cache_resource
+def get_street_graph(path):
+    # Memory-mapped, so every session shares the same pages
+    return StreetGraph(path)
+
+# --- Warm Start (once per server process, so the first search after a deploy is fast) ---
+@st.cache_resource
+def start_warmup(api_key, budget):
+    return Warmup().start(gmaps=get_maps_client(api_key) if api_key else None,
+                          caches=[get_geocode_cache(), get_walk_cache()], venue_index=get_venue_index(), budget=budget)
+
+warmup = start_warmup(st.secrets["gmaps_api_key"] if "gmaps_api_key" in st.secrets else None,
+                      st.secrets["prefetch_budget"] if "prefetch_budget" in st.secrets else PREFETCH_BUDGET)
+
+# --- Group Search Options ---
+MAX_PEOPLE = 10
+ORDINALS = ["First", "Second", "Third", "Fourth", "Fifth", "Sixth", "Seventh", "Eighth", "Ninth", "Tenth"]
+RANK_LABELS = {"minimax": "Fairest (shortest longest walk)", "total": "Least total walking"}
+ANCHOR_COLORS = [
+    [0, 100, 255, 255], [0, 255, 100, 255], [255, 170, 0, 255], [150, 0, 255, 255], [0, 190, 190, 255],
+    [255, 0, 170, 255], [120, 80, 0, 255], [40, 40, 40, 255], [130, 130, 130, 255], [0, 120, 0, 255],
+]
+
 # --- State Management ---
 if "expander_open" not in st.session_state:
     st.session_state.expander_open = True
 if "results" not in st.session_state:
     st.session_state.results = None
+if "last_search" not in st.session_state:
+    st.session_state.last_search = None
+if "autocomplete_tokens" not in st.session_state:
+    st.session_state.autocomplete_tokens = {}
 
 # --- CSS Injection (Clean Roboto & Slider-Matching Button) ---
 st.markdown("""
@@ -75,160 +143,84 @@ if not check_password():
 
 # --- APP HEADER ---
 st.title("Meetup Triangulator")
+if not warmup.ready:
+    st.caption("Warming up after an update; the first search may take a little longer.")
 
-# --- SEARCH PANEL ---
-with st.expander("Configure Search", expanded=st.session_state.expander_open):
-    # API KEY LOGIC
-    if "gmaps_api_key" in st.secrets:
-        api_key = st.secrets["gmaps_api_key"]
-    else:
-        api_key = st.text_input("Google Maps API Key", type="password")
-
-    with st.form("search_form", border=False):
-        col1, col2 = st.columns(2)
-        with col1:
-            loc_a_text = st.text_input("First Location", value="")
-            max_mins = st.slider("Max Walking Minutes", 5, 30, 15)
-        with col2:
-            loc_b_text = st.text_input("Second Location", value="")
-            min_rating = st.slider("Minimum Rating", 0, 5, 4)
-
-        # FULL RESTORED CUISINE LIST
-        CUISINE_OPTIONS = [
-            "Any", "American", "Asian Fusion", "Bagels", "Bakery", "Bar", "Barbecue", 
-            "Breakfast", "Brunch", "Burgers", "Cafe", "Cajun", "Caribbean", "Chinese", 
-            "Cocktails", "Coffee", "Deli", "Dessert", "Dim Sum", "Diner", "Donuts", 
-            "Ethiopian", "Fast Food", "Filipino", "French", "German", "Greek", "Halal", 
-            "Ice Cream", "Indian", "Indonesian", "Irish", "Italian", "Japanese", "Korean", 
-            "Latin American", "Mediterranean", "Mexican", "Middle Eastern", "Noodles", 
-            "Pizza", "Poke", "Pub", "Ramen", "Salad", "Sandwiches", "Seafood", "Soup", 
-            "Southern", "Spanish", "Steakhouse", "Sushi", "Tacos", "Tapas", "Tea", 
-            "Thai", "Vegan", "Vegetarian", "Vietnamese", "Wine Bar", "Wings"
-        ]
-        
-        selected_cuisines = st.multiselect("Cuisines (Leave empty for Any)", options=CUISINE_OPTIONS)
-        
-        # Unique key 'search_btn' used for CSS targeting above
-        submit_button = st.form_submit_button("Search Locations", key="search_btn")
+# --- RESULTS VIEW (also used to stream partial results while searching) ---
+def build_view(res):
+    """Arrow table and Deck for a result set, built once and reused across reruns."""
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pydeck as pdk
 
-# --- LOGIC PROCESSING ---
-if submit_button:
-    if not api_key:
-        st.error("Missing API Key.")
-    elif not loc_a_text or not loc_b_text:
-        st.warning("Please enter both locations.")
-    else:
-        gmaps = googlemaps.Client(key=api_key)
-        try:
-            with st.spinner("Triangulating..."):
-                # 1. Geocode
-                geo_a = gmaps.geocode(loc_a_text)
-                geo_b = gmaps.geocode(loc_b_text)
-                
-                if not geo_a or not geo_b:
-                    st.error("One of the addresses could not be found.")
-                else:
-                    coords_a = geo_a[0]['geometry']['location']
-                    coords_b = geo_b[0]['geometry']['location']
-                    
-                    # 2. Search Area (walk_speed * mins * slight overlap buffer)
-                    search_radius = max_mins * 80 * 1.3
-                    search_terms = selected_cuisines if (selected_cuisines and "Any" not in selected_cuisines) else [None]
-                    
-                    all_venues = []
-                    for term in search_terms:
-                        res = gmaps.places_nearby(location=coords_a, radius=search_radius, type="restaurant", keyword=term)
-                        all_venues.extend(res.get('results', []))
-                    
-                    # Deduplicate results by Place ID
-                    venues = list({v['place_id']: v for v in all_venues}.values())
-                    
-                    # 3. Filter by Walk Time via Distance Matrix
-                    final_list = []
-                    if venues:
-                        # Process top 25 for efficient single API call
-                        venues = venues[:25]
-                        chunk_coords = [v['geometry']['location'] for v in venues]
-                        dm = gmaps.distance_matrix(origins=[coords_a, coords_b], destinations=chunk_coords, mode="walking")
-                        
-                        for j, venue in enumerate(venues):
-                            rating = venue.get('rating', 0)
-                            if rating < min_rating: continue
-                            
-                            try:
-                                # Duration values are in seconds, convert to minutes
-                                w_a = dm['rows'][0]['elements'][j]['duration']['value'] / 60
-                                w_b = dm['rows'][1]['elements'][j]['duration']['value'] / 60
-                                
-                                if w_a <= max_mins and w_b <= max_mins:
-                                    query = urllib.parse.quote(venue['name'])
-                                    maps_url = f"https://www.google.com/maps/search/?api=1&query={query}&query_place_id={venue.get('place_id')}"
-                                    final_list.append({
-                                        "Name": venue['name'],
-                                        "Rating": rating,
-                                        "Mins from A": round(w_a, 1),
-                                        "Mins from B": round(w_b, 1),
-                                        "Link": maps_url, 
-                                        "lat": venue['geometry']['location']['lat'],
-                                        "lon": venue['geometry']['location']['lng'],
-                                        "color_rgb": [255, 75, 75, 200],
-                                        "tooltip_extra": f"Rating: {rating} ⭐"
-                                    })
-                            except (KeyError, IndexError):
-                                continue
-
-                    if not final_list:
-                        st.warning("No matches found within that walking distance of both locations.")
-                    else:
-                        st.session_state.results = {
-                            "list": final_list,
-                            "coords_a": coords_a,
-                            "coords_b": coords_b
-                        }
-                        st.session_state.expander_open = False
-                        st.rerun()
-        except Exception as e:
-            st.error(f"Search failed: {e}")
+    table = res['table']
+    key = (tuple((o['lat'], o['lng']) for o in res['origins']), tuple(table['place_id']))
+    cached = st.session_state.get("view")
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
 
-# --- DISPLAY RESULTS ---
-if st.session_state.results and not st.session_state.expander_open:
-    res = st.session_state.results
-    map_df = pd.DataFrame(res['list'])
-    
-    # Start and End Markers
-    anchors = pd.DataFrame([
-        {"lat": res['coords_a']['lat'], "lon": res['coords_a']['lng'], "Name": "Location A", "color_rgb": [0, 100, 255, 255], "tooltip_extra": "Starting Point"},
-        {"lat": res['coords_b']['lat'], "lon": res['coords_b']['lng'], "Name": "Location B", "color_rgb": [0, 255, 100, 255], "tooltip_extra": "Starting Point"} 
-    ])
-    full_df = pd.concat([map_df, anchors], ignore_index=True)
+    # The results grid reads the typed columns straight from Arrow, no per-venue dicts
+    data = pa.table(table)
+
+    # The map gets only the columns its layers read, coordinates to ~10 cm; the venue
+    # color is a layer constant, not a list per row
+    venues = pd.DataFrame({
+        "lon": table['lon'].round(6), "lat": table['lat'].round(6), "Name": table['Name'],
+        "detail": np.char.mod("Rating: %.1f ⭐", table['Rating']),
+    })
+    # Start Markers, one color per person
+    anchors = pd.DataFrame({
+        "lon": [round(o['lng'], 6) for o in res['origins']], "lat": [round(o['lat'], 6) for o in res['origins']],
+        "Name": [f"Location {LETTERS[k]}" for k in range(len(res['origins']))],
+        "detail": "Starting Point", "color": ANCHOR_COLORS[:len(res['origins'])],
+    })
 
     # Clean Map View
-    st.pydeck_chart(pdk.Deck(
+    deck = pdk.Deck(
         map_style='light',
         initial_view_state=pdk.ViewState(
-            latitude=full_df['lat'].mean(),
-            longitude=full_df['lon'].mean(),
+            latitude=float(np.concatenate([table['lat'], anchors['lat']]).mean()),
+            longitude=float(np.concatenate([table['lon'], anchors['lon']]).mean()),
             zoom=13.5),
         layers=[
-            pdk.Layer('ScatterplotLayer', data=full_df, get_position='[lon, lat]', 
-                      get_color='color_rgb', get_radius=40, pickable=True),
+            pdk.Layer('ScatterplotLayer', data=venues, get_position='[lon, lat]',
+                      get_fill_color=[255, 75, 75, 200], get_radius=40, pickable=True),
+            pdk.Layer('ScatterplotLayer', data=anchors, get_position='[lon, lat]',
+                      get_fill_color='color', get_radius=40, pickable=True),
         ],
-        tooltip={"text": "{Name}\n{tooltip_extra}"}
-    ))
+        tooltip={"text": "{Name}\n{detail}"}
+    )
+    st.session_state.view = (key, data, deck)
+    return data, deck
+
+def render_results(res):
+    data, deck = build_view(res)
+    st.pydeck_chart(deck)
 
     # Unified Legend
-    st.markdown("""
-    <div style="display: flex; gap: 20px; font-size: 13px; margin: 10px 0 30px 0; justify-content: center; color: #666;">
-        <div><span style="color:#0064FF">●</span> Start A</div>
-        <div><span style="color:#00FF64">●</span> Start B</div>
+    starts = "".join(
+        f'<div><span style="color:#{r:02X}{g:02X}{b:02X}">●</span> Start {LETTERS[k]}</div>'
+        for k, (r, g, b, _) in enumerate(ANCHOR_COLORS[:len(res['origins'])])
+    )
+    st.markdown(f"""
+    <div style="display: flex; flex-wrap: wrap; gap: 20px; font-size: 13px; margin: 10px 0 30px 0; justify-content: center; color: #666;">
+        {starts}
         <div><span style="color:#FF4B4B">●</span> Restaurants</div>
     </div>
     """, unsafe_allow_html=True)
 
+    # Search Coverage (lens plan vs the old single circle around A)
+    plan = res['plan']
+    st.caption(f"Searched {len(plan.circles)} area(s) per cuisine covering {plan.searched_area / 1e6:.2f} km², "
+               f"vs 1 circle of {plan.naive_area / 1e6:.2f} km² around Location A "
+               f"(both planned up to {SEARCH_HEADROOM_MINS} min wider than the walking limit).")
+
     # Clean Results Data
     st.dataframe(
-        map_df,
-        column_order=["Name", "Rating", "Mins from A", "Mins from B", "Link"],
+        data,
+        column_order=["Name", "Rating"] + [f"Mins from {LETTERS[k]}" for k in range(len(res['origins']))]
+                     + (["Longest walk", "Total walk"] if len(res['origins']) > 2 else []) + ["Link"],
         use_container_width=True, hide_index=True,
         column_config={
             "Link": st.column_config.LinkColumn("Google Maps", display_text="Directions 🔗"),
@@ -236,11 +228,141 @@ if st.session_state.results and not st.session_state.expander_open:
         }
     )
 
+# --- SEARCH PANEL (reruns on its own; a finished search reruns the whole app) ---
+def location_suggestions(api_key, k, text):
+    """Autocomplete for the k-th location field; one session token per field until a search uses it."""
+    if not api_key:
+        return []
+    token = st.session_state.autocomplete_tokens.setdefault(k, new_session_token())
+    # Metered like a search, so keystroke requests show in the metrics log and quota burn
+    metrics = SearchMetrics(kind="autocomplete")
+    try:
+        return suggest(metrics.client(get_maps_client(api_key)), get_prefix_cache(), text, token)
+    except (googlemaps.exceptions.ApiError, googlemaps.exceptions.TransportError, googlemaps.exceptions.Timeout):
+        # Typing still works without suggestions; the text is geocoded on submit
+        return []
+    finally:
+        # Prefix cache hits cost nothing and aren't logged
+        if metrics.api:
+            log_search(metrics)
+
+@st.fragment
+def search_panel():
+    with st.expander("Configure Search", expanded=st.session_state.expander_open):
+        # API KEY LOGIC
+        if "gmaps_api_key" in st.secrets:
+            api_key = st.secrets["gmaps_api_key"]
+        else:
+            api_key = st.text_input("Google Maps API Key", type="password")
+
+        # Outside the form so the location fields follow it right away
+        people = st.number_input("People", min_value=2, max_value=MAX_PEOPLE, value=2)
+
+        # Suggestions need reruns while typing, so the locations live outside the form.
+        # A picked suggestion resolves by Place ID; unpicked text is geocoded as typed.
+        cols = st.columns(2)
+        locations = []
+        for k in range(people):
+            with cols[k % 2]:
+                locations.append(st_searchbox(
+                    lambda text, k=k: location_suggestions(api_key, k, text),
+                    label=f"{ORDINALS[k]} Location", placeholder="Start typing an address",
+                    key=f"location_{k}", default_use_searchterm=True, edit_after_submit="current",
+                    debounce=DEBOUNCE_MS, rerun_scope="fragment",
+                ))
+
+        with st.form("search_form", border=False):
+            col1, col2 = st.columns(2)
+            with col1:
+                max_mins = st.slider("Max Walking Minutes", 5, 30, 15)
+            with col2:
+                min_rating = st.slider("Minimum Rating", 0, 5, 4)
+            rank = st.radio("Rank by", ["minimax", "total"], horizontal=True, format_func=RANK_LABELS.get)
+
+            selected_cuisines = st.multiselect("Cuisines (Leave empty for Any)", options=CUISINE_OPTIONS)
+            
+            # Unique key 'search_btn' used for CSS targeting above
+            submit_button = st.form_submit_button("Search Locations", key="search_btn")
+
+    # --- LOGIC PROCESSING ---
+    if submit_button:
+        if not api_key:
+            st.error("Missing API Key.")
+        elif not all(locations):
+            st.warning("Please enter every location.")
+        else:
+            gmaps = get_maps_client(api_key)
+            metrics = SearchMetrics()
+            try:
+                live = st.empty()
+                with st.spinner("Triangulating..."):
+                    street_graph = get_street_graph(st.secrets["street_graph"]) if "street_graph" in st.secrets else None
+                    # Show venues as they qualify, while later Places pages are still loading.
+                    # Same locations and cuisines as last time: re-filter its candidates instead.
+                    # Someone else running the same search right now: follow theirs.
+                    for res in coalesced_triangulate_stream(
+                            get_single_flight(), gmaps, locations, max_mins, min_rating, selected_cuisines,
+                            get_geocode_cache(), get_walk_cache(), street_graph, metrics=metrics,
+                            previous=st.session_state.last_search, venue_index=get_venue_index(), rank=rank,
+                            isochrones=get_isochrone_store()):
+                        if len(res['table']['place_id']):
+                            with live.container():
+                                render_results(res)
+                    st.session_state.last_search = res
+                    # Place Details ended these autocomplete sessions; typing again starts new ones
+                    st.session_state.autocomplete_tokens = {}
+                    plan = res['plan']
+
+                    if not plan.circles:
+                        st.warning("Those locations are too far apart to meet within that walking time.")
+                    elif not len(res['table']['place_id']):
+                        st.warning("No matches found within that walking distance of every location.")
+                    else:
+                        del res['metrics']
+                        st.session_state.results = res
+                        st.session_state.expander_open = False
+                        st.rerun()
+            except AddressNotFound as e:
+                st.error(str(e))
+            except Exception as e:
+                st.error(f"Search failed: {e}")
+            finally:
+                log_search(metrics)
+                st.session_state.last_metrics = metrics
+
+# --- DISPLAY RESULTS (reruns on its own) ---
+@st.fragment
+def results_view():
+    render_results(st.session_state.results)
+
     # Footer Action
     if st.button("New Search"):
         st.session_state.expander_open = True
         st.session_state.results = None
         st.rerun()
 
+search_panel()
+
+if st.session_state.results and not st.session_state.expander_open:
+    results_view()
 elif st.session_state.expander_open:
-    st.info("Find the perfect middle ground between two people.")
+    st.info("Find the perfect middle ground for everyone in the group.")
+
+# --- DEBUG PANEL (add ?debug=1 to the URL) ---
+if st.query_params.get("debug") and st.session_state.get("last_metrics"):
+    import pandas as pd
+
+    with st.expander("Debug: last search"):
+        st.dataframe(pd.DataFrame(st.session_state.last_metrics.rows()), use_container_width=True, hide_index=True)
+        burn = quota_burn()
+        # Places Nearby, Details and Autocomplete all draw on the one Places quota
+        st.caption("Quota burn today: " + "; ".join(
+            f"{quota} {usage['requests']}/{DAILY_QUOTA} requests ("
+            + ", ".join(f"{api} {n}" for api, n in usage["calls"].items()) + f"; {usage['elements']} elements)"
+            for quota, usage in burn.items()))
+        if "gmaps_api_key" in st.secrets:
+            st.caption("Maps client: {retries} retries, {throttled} throttled, concurrency limits {limits}".format(
+                **get_maps_client(st.secrets["gmaps_api_key"]).stats()))
+        flights = get_single_flight()
+        st.caption(f"Coalescing: {flights.leaders} searches run, {flights.followers} joined one already running.")
+        st.caption("Warm-up: " + ", ".join(f"{step} {status}" for step, status in warmup.status.items()))
@@ -0,0 +1,67 @@
+"""Address suggestions for the location fields.
+
+Predictions come from Place Autocomplete under a per-field session token, so the keystrokes
+and the Place Details lookup that ends the session bill as one session. Predictions per
+typed prefix are kept in memory and shared by every session.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from search import normalize_address
+
+# Fewer characters than this match too much of the world to be worth a request
+MIN_CHARS = 3
+# Pause in typing (ms) before the searchbox asks for suggestions
+DEBOUNCE_MS = 300
+PREFIX_CACHE_ENTRIES = 20000
+
+
+class PrefixCache:
+    """LRU of predictions per normalized prefix; one instance is shared by every session."""
+
+    def __init__(self, max_entries=PREFIX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, predictions):
+        with self._lock:
+            self._entries[key] = predictions
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def new_session_token():
+    return uuid.uuid4().hex
+
+
+def suggest(gmaps, cache, text, session_token):
+    """(label, selection) pairs for the typed text, best match first.
+
+    A selection is {"description", "place_id", "session_token"}; geocode_all resolves it to
+    coordinates with one Place Details call instead of geocoding the text.
+    """
+    key = normalize_address(text)
+    if len(key) < MIN_CHARS:
+        return []
+    predictions = cache.get(key)
+    if predictions is None:
+        predictions = [
+            {"description": p["description"], "place_id": p["place_id"]}
+            for p in gmaps.places_autocomplete(text, session_token=session_token)
+        ]
+        cache.set(key, predictions)
+    return [(p["description"], {**p, "session_token": session_token}) for p in predictions]
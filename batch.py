@@ -0,0 +1,114 @@
+"""Runs meetup searches for many location pairs (or groups), streaming one JSON line per row.
+
+Input is a CSV with a header or a JSONL file; each row needs locations `a` and `b` (groups
+add `c`, `d`, ... or give a `locations` list in JSONL) and may override `max_mins`,
+`min_rating`, `rank` and `cuisines` (a list, or "Thai;Sushi" in CSV):
+
+    python batch.py pairs.csv --key AIza... --workers 8 --qps 10 > results.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache import open_geocode_cache, open_walk_cache
+from candidates import records
+from engine import AddressNotFound, triangulate
+from isochrones import IsochroneStore
+from metrics import SearchMetrics, log_search
+from replay import RecordingClient
+from streetgraph import StreetGraph
+from throttle import ThrottledClient, pooled_client
+from venues import VenueIndex
+
+
+def read_pairs(path):
+    with open(path, newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    for row in rows:
+        if "locations" not in row:
+            row["locations"] = [row[k] for k in "abcdefghij" if row.get(k)]
+        if isinstance(row.get("cuisines"), str):
+            row["cuisines"] = [c.strip() for c in row["cuisines"].split(";") if c.strip()]
+    return rows
+
+
+def row_setting(row, key, default, cast):
+    """row[key] as cast, or default where the row leaves it out (missing, null or an empty
+    CSV cell); 0 is a setting, not a gap."""
+    value = row.get(key)
+    return cast(default if value is None or value == "" else value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pairs", help="CSV or JSONL file of location pairs")
+    parser.add_argument("--out", help="output JSONL file (default: stdout)")
+    parser.add_argument("--key", default=os.environ.get("GMAPS_API_KEY"), help="Google Maps API key (or $GMAPS_API_KEY)")
+    parser.add_argument("--workers", type=int, default=8, help="pairs searched concurrently")
+    parser.add_argument("--qps", type=int, default=10, help="global cap on Maps requests per second")
+    parser.add_argument("--max-mins", type=int, default=15)
+    parser.add_argument("--min-rating", type=float, default=4)
+    parser.add_argument("--rank", choices=["minimax", "total"], default="minimax")
+    parser.add_argument("--street-graph", help="walk on a local street graph instead of Distance Matrix")
+    parser.add_argument("--record", help="also append every Maps answer to this JSONL (for replay.py/bench.py)")
+    args = parser.parse_args(argv)
+    if not args.key:
+        parser.error("a Google Maps API key is required (--key or $GMAPS_API_KEY)")
+
+    # One client for every worker, so its rate limits and queries_per_second cap are global
+    gmaps = pooled_client(args.key, args.qps)
+    if args.record:
+        gmaps = RecordingClient(gmaps, args.record)
+    gmaps = ThrottledClient(gmaps)
+    # Same cache files as the app: overnight runs warm the app's caches too
+    geocode_cache = open_geocode_cache()
+    walk_cache = open_walk_cache()
+    street_graph = StreetGraph(args.street_graph) if args.street_graph else None
+    venue_index = VenueIndex()
+    isochrones = IsochroneStore()
+
+    def run(row):
+        metrics = SearchMetrics()
+        try:
+            res = triangulate(
+                gmaps, row["locations"],
+                row_setting(row, "max_mins", args.max_mins, int), row_setting(row, "min_rating", args.min_rating, float),
+                row.get("cuisines") or [], geocode_cache, walk_cache, street_graph, metrics=metrics,
+                venue_index=venue_index, rank=row.get("rank") or args.rank, isochrones=isochrones,
+            )
+        except AddressNotFound as e:
+            return {"status": "not_found", "error": str(e)}
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+        finally:
+            # Batch runs burn the same daily quota as the app
+            log_search(metrics)
+        return {
+            "status": "ok" if len(res["table"]["place_id"]) else ("too_far" if not res["plan"].circles else "no_matches"),
+            "origins": res["origins"],
+            "results": records(res["table"]),
+        }
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    lock = threading.Lock()
+    pairs = read_pairs(args.pairs)
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(run, row): (i, row) for i, row in enumerate(pairs)}
+        for future in as_completed(futures):
+            i, row = futures[future]
+            with lock:
+                out.write(json.dumps({"line": i, "locations": row["locations"], **future.result()}) + "\n")
+                out.flush()
+    if out is not sys.stdout:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Stage-level benchmark of the search pipeline against recorded Maps answers.
+
+Record once (spends quota), then replay as often as needed:
+
+    python batch.py pairs.csv --record recorded.jsonl > /dev/null
+    python bench.py recorded.jsonl pairs.csv --sessions 8 --repeat 5 --latency 0.15
+
+Every session is a thread running the pairs like a Streamlit session would, sharing the
+process-wide caches (or with fresh caches per search under --cold) and, unless
+--no-coalesce, joining identical searches already running as the app does. Exits 1 when the
+end-to-end p95 exceeds --max-p95, so it can gate a deploy.
+"""
+import argparse
+import functools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batch import read_pairs, row_setting
+from cache import open_geocode_cache, open_walk_cache
+from engine import AddressNotFound, coalesced_triangulate_stream, triangulate_stream
+from isochrones import IsochroneStore
+from metrics import SearchMetrics
+from replay import ReplayClient
+from singleflight import SingleFlight
+from throttle import ThrottledClient
+from venues import VenueIndex
+
+STAGES = ("geocode", "plan", "places", "prune", "isochrones", "walk_times", "filter")
+
+
+def _caches(directory):
+    return {
+        # The app's cache limits, so the benchmark sees the same eviction
+        "geocode_cache": open_geocode_cache(os.path.join(directory, "geocode.sqlite3")),
+        "walk_cache": open_walk_cache(os.path.join(directory, "walk_times.sqlite3")),
+        "venue_index": VenueIndex(path=os.path.join(directory, "venues.sqlite3")),
+        "isochrones": IsochroneStore(path=os.path.join(directory, "isochrones.sqlite3")),
+    }
+
+
+def _ms(values, q):
+    return np.percentile(values, q) * 1000 if values else float("nan")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="JSONL written by batch.py --record")
+    parser.add_argument("pairs", help="CSV or JSONL of location pairs (batch.py format)")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the pairs per session")
+    parser.add_argument("--latency", type=float, default=0.15, help="injected seconds per Maps call")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of Maps calls that fail")
+    parser.add_argument("--cold", action="store_true", help="fresh caches for every search")
+    parser.add_argument("--no-coalesce", action="store_true", help="don't share identical concurrent searches")
+    parser.add_argument("--max-mins", type=int, default=15)
+    parser.add_argument("--min-rating", type=float, default=4)
+    parser.add_argument("--max-p95", type=float, help="fail if end-to-end p95 exceeds this many ms")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    replay = ReplayClient(args.recording, args.latency, args.jitter, args.error_rate, seed=args.seed)
+    # Same rate limits and retries as the app, so injected errors are retried like real ones
+    gmaps = ThrottledClient(replay)
+    pairs = read_pairs(args.pairs)
+    timings = {stage: [] for stage in STAGES}
+    lock = threading.Lock()
+    searches, failures = [], []
+    # Shared by every session, as in the app, so identical searches coalesce the same way
+    flights = None if args.no_coalesce else SingleFlight()
+    stream = triangulate_stream if flights is None else functools.partial(coalesced_triangulate_stream, flights)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shared = _caches(tmp)
+
+        def session(n):
+            order = pairs * args.repeat
+            random.Random(args.seed + n).shuffle(order)
+            for i, row in enumerate(order):
+                caches = _caches(tempfile.mkdtemp(dir=tmp)) if args.cold else shared
+                metrics = SearchMetrics()
+                start = time.perf_counter()
+                try:
+                    for _ in stream(
+                            gmaps, row["locations"],
+                            row_setting(row, "max_mins", args.max_mins, int),
+                            row_setting(row, "min_rating", args.min_rating, float),
+                            row.get("cuisines") or [], metrics=metrics, **caches):
+                        pass
+                except AddressNotFound:
+                    pass
+                except Exception as e:
+                    with lock:
+                        failures.append(repr(e))
+                    continue
+                finally:
+                    with lock:
+                        for name, stage in metrics.stages.items():
+                            # A joined search only records its "coalesced" hit
+                            if "ms" in stage:
+                                timings[name].append(stage["ms"] / 1000)
+                with lock:
+                    searches.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            list(pool.map(session, range(args.sessions)))
+        wall = time.perf_counter() - start
+
+    total = len(searches) + len(failures)
+    print(f"{args.sessions} sessions, {total} searches in {wall:.2f}s "
+          f"({total / wall:.1f} searches/s), {len(failures)} failed")
+    print(f"{'stage':<12}{'runs':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, values in timings.items():
+        print(f"{stage:<12}{len(values):>8}{_ms(values, 50):>10.1f}{_ms(values, 95):>10.1f}")
+    print(f"{'search':<12}{len(searches):>8}{_ms(searches, 50):>10.1f}{_ms(searches, 95):>10.1f}")
+    print("Maps calls per search: " + ", ".join(
+        f"{method} {n / max(total, 1):.2f}" for method, n in replay.calls.items()))
+    if any(replay.misses.values()):
+        print("Unrecorded requests: " + ", ".join(f"{m} {n}" for m, n in replay.misses.items() if n))
+    if flights is not None:
+        print(f"Coalescing: {flights.leaders} searches run, {flights.followers} joined one already running")
+    print("Client: {retries} retries, {throttled} throttled, concurrency limits {limits}".format(**gmaps.stats()))
+
+    if args.max_p95 is not None and _ms(searches, 95) > args.max_p95:
+        print(f"FAIL: search p95 above {args.max_p95:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
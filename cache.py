@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Shared on-disk caches live here (one SQLite file per cache)
+CACHE_DIR = os.environ.get("MEETUP_CACHE_DIR", ".cache")
+# Share of max_entries evicted at once when a write goes over the bound
+EVICT_FRACTION = 0.1
+
+
+class SqliteCache:
+    """JSON key/value store on SQLite with a TTL, LRU eviction and hit/miss counters.
+
+    One instance is meant to be shared by every session/thread in the process.
+    """
+
+    def __init__(self, name, ttl, max_entries, path=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        # Upper bound on the row count (replaced keys count twice); recounted before evicting
+        (self._size,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Returns {key: value} for every key that is cached and not expired."""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, value, created FROM entries WHERE key IN ({marks})", batch
+                ).fetchall()
+                fresh = [(k, v) for k, v, created in rows if now - created <= self.ttl]
+                stale = [k for k, _, created in rows if now - created > self.ttl]
+                found.update((k, json.loads(v)) for k, v in fresh)
+                if fresh:
+                    self._db.executemany("UPDATE entries SET used = ? WHERE key = ?", [(now, k) for k, _ in fresh])
+                if stale:
+                    self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in stale])
+                    self._size -= len(stale)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        rows = [(k, json.dumps(v), now, now) for k, v in items.items()]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+            self._size += len(rows)
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries in one batch, down to EVICT_FRACTION below the
+        bound, so the count and eviction queries run once per that many writes, not per write."""
+        (self._size,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        n = self._size - int(self.max_entries * (1 - EVICT_FRACTION))
+        if n > 0:
+            self._db.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used LIMIT ?)", (n,))
+            self._size -= n
+
+    def warm(self, limit):
+        """Primes the OS page cache with the most recently used entries; returns how many were read.
+
+        Nothing is kept in process: the rows are read and dropped so their file pages are
+        resident, and with the file memory-mapped later lookups read those pages directly
+        instead of from disk.
+        """
+        with self._lock:
+            self._db.execute("PRAGMA mmap_size = 268435456")
+            rows = self._db.execute("SELECT key, value FROM entries ORDER BY used DESC LIMIT ?", (limit,)).fetchall()
+        return len(rows)
+
+    def stats(self):
+        with self._lock:
+            (size,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+
+# Geocodes and walking durations barely change; Google allows caching them for 30 days
+def open_geocode_cache(path=None):
+    return SqliteCache("geocode", ttl=30 * 24 * 3600, max_entries=5000, path=path)
+
+
+def open_walk_cache(path=None):
+    # Keyed on (origin grid cell, place_id), see matrix.cached_walking_matrix
+    return SqliteCache("walk_times", ttl=30 * 24 * 3600, max_entries=200000, path=path)
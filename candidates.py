@@ -0,0 +1,113 @@
+import copy
+import logging
+import urllib.parse
+
+import numpy as np
+
+from geo import haversine, walk_reach
+
+log = logging.getLogger(__name__)
+
+# Participants are labelled A, B, C, ... in results
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class Candidates:
+    """Every venue a search has seen, in columns, with walking minutes from each origin.
+
+    mins[i, k] is nan until venue i has been timed from origin k. searched_mins is the
+    walking time the Places coverage was planned for, so a wider search knows to refetch.
+    """
+
+    def __init__(self, origins):
+        self.origins = origins
+        self.searched_mins = 0
+        self.place_id = np.array([], dtype=object)
+        self.name = np.array([], dtype=object)
+        self.rating = np.array([], dtype=float)
+        self.lat = np.array([], dtype=float)
+        self.lng = np.array([], dtype=float)
+        self.mins = np.empty((0, len(origins)))
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.place_id)
+
+    def copy(self):
+        """An independent copy another session can keep filtering and adding to."""
+        other = copy.copy(self)
+        # add() replaces the other columns rather than writing into them
+        other.mins = self.mins.copy()
+        other._rows = dict(self._rows)
+        return other
+
+    def add(self, venues):
+        """Appends venues not seen before (by place_id), returns their row indices."""
+        new = [v for v in venues if v['place_id'] not in self._rows]
+        start = len(self)
+        for i, v in enumerate(new):
+            self._rows[v['place_id']] = start + i
+        self.place_id = np.concatenate([self.place_id, np.array([v['place_id'] for v in new], dtype=object)])
+        self.name = np.concatenate([self.name, np.array([v['name'] for v in new], dtype=object)])
+        self.rating = np.concatenate([self.rating, np.array([v.get('rating', 0) for v in new], dtype=float)])
+        self.lat = np.concatenate([self.lat, np.array([v['geometry']['location']['lat'] for v in new], dtype=float)])
+        self.lng = np.concatenate([self.lng, np.array([v['geometry']['location']['lng'] for v in new], dtype=float)])
+        self.mins = np.vstack([self.mins, np.full((len(new), len(self.origins)), np.nan)])
+        return np.arange(start, len(self))
+
+    def needing_times(self, rows, max_mins, min_rating):
+        """Rows that could still qualify but have no walking times yet.
+
+        Drops, in order, venues below min_rating and venues whose straight-line distance
+        from any origin is already beyond walking reach (a walk is never shorter than that),
+        so no Distance Matrix elements are spent on them.
+        """
+        rows = np.asarray(rows, dtype=int)
+        rated = rows[self.rating[rows] >= min_rating]
+        olat = np.array([o['lat'] for o in self.origins])
+        olng = np.array([o['lng'] for o in self.origins])
+        dist = haversine(self.lat[rated, None], self.lng[rated, None], olat, olng)
+        reachable = rated[(dist <= walk_reach(max_mins)).all(axis=1)]
+        untimed = reachable[np.isnan(self.mins[reachable]).any(axis=1)]
+        log.info("pruning: %d candidates -> %d rated >= %s -> %d within walking reach -> %d untimed",
+                 len(rows), len(rated), min_rating, len(reachable), len(untimed))
+        return untimed
+
+    def locations(self, rows):
+        return [{"lat": float(self.lat[i]), "lng": float(self.lng[i])} for i in rows]
+
+    def select(self, max_mins, min_rating, rank="minimax"):
+        """Rows that qualify under the given filters, best first; nan (untimed or no route) never does.
+
+        "minimax" ranks by the longest walk anyone has (fairest), "total" by everyone's
+        walking time summed; ties go to the higher rating.
+        """
+        with np.errstate(invalid="ignore"):
+            ok = np.flatnonzero((self.rating >= min_rating) & (self.mins <= max_mins).all(axis=1))
+        score = self.mins[ok].max(axis=1) if rank == "minimax" else self.mins[ok].sum(axis=1)
+        return ok[np.lexsort((-self.rating[ok], score))]
+
+    def table(self, rows):
+        """Display columns for the given row indices, in that order: one typed array per field."""
+        rows = np.asarray(rows, dtype=int)
+        mins = self.mins[rows]
+        names, ids = self.name[rows], self.place_id[rows]
+        table = {"Name": names, "Rating": self.rating[rows]}
+        for k in range(len(self.origins)):
+            table[f"Mins from {LETTERS[k]}"] = mins[:, k].round(1)
+        table["Longest walk"] = mins.max(axis=1).round(1)
+        table["Total walk"] = mins.sum(axis=1).round(1)
+        table["Link"] = np.array([
+            f"https://www.google.com/maps/search/?api=1&query={urllib.parse.quote(n)}&query_place_id={p}"
+            for n, p in zip(names, ids)
+        ], dtype=object)
+        table["lat"] = self.lat[rows]
+        table["lon"] = self.lng[rows]
+        table["place_id"] = ids
+        return table
+
+
+def records(table):
+    """One plain dict per venue, for JSON output."""
+    columns = {name: column.tolist() for name, column in table.items()}
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
@@ -0,0 +1,219 @@
+import numpy as np
+
+from candidates import Candidates
+from geo import WALK_SPEED, walk_reach
+from isochrones import rule_out
+from matrix import cached_walking_matrix
+from metrics import SearchMetrics
+from planner import plan_search
+from search import geocode_all, location_key, stream_places
+
+# Places coverage is planned a few minutes wider than asked, so loosening the walking
+# slider a little re-filters cached candidates instead of searching again
+SEARCH_HEADROOM_MINS = 5
+MAX_MINS = 30
+
+CUISINE_OPTIONS = [
+    "Any", "American", "Asian Fusion", "Bagels", "Bakery", "Bar", "Barbecue", 
+    "Breakfast", "Brunch", "Burgers", "Cafe", "Cajun", "Caribbean", "Chinese", 
+    "Cocktails", "Coffee", "Deli", "Dessert", "Dim Sum", "Diner", "Donuts", 
+    "Ethiopian", "Fast Food", "Filipino", "French", "German", "Greek", "Halal", 
+    "Ice Cream", "Indian", "Indonesian", "Irish", "Italian", "Japanese", "Korean", 
+    "Latin American", "Mediterranean", "Mexican", "Middle Eastern", "Noodles", 
+    "Pizza", "Poke", "Pub", "Ramen", "Salad", "Sandwiches", "Seafood", "Soup", 
+    "Southern", "Spanish", "Steakhouse", "Sushi", "Tacos", "Tapas", "Tea", 
+    "Thai", "Vegan", "Vegetarian", "Vietnamese", "Wine Bar", "Wings"
+]
+
+
+class AddressNotFound(Exception):
+    pass
+
+
+def search_terms(cuisines):
+    """Places keywords for the selected cuisines; None means no keyword filter."""
+    return list(cuisines) if (cuisines and "Any" not in cuisines) else [None]
+
+
+def search_plan(origins, max_mins):
+    """(places_mins, plan): the walking minutes Places coverage is planned for, and the plan
+    triangulate_stream searches for these origins and max_mins."""
+    places_mins = min(max_mins + SEARCH_HEADROOM_MINS, MAX_MINS)
+    # The old single circle, sized for the same headroom so the areas compare like for like
+    naive_radius = places_mins * 80 * 1.3
+    return places_mins, plan_search(origins, walk_reach(places_mins), naive_radius)
+
+
+def _time_rows(gmaps, candidates, rows, max_mins, walk_cache, street_graph, metrics, isochrones=None):
+    """Fills in walking minutes for rows: local street graph if given, else Distance Matrix
+    (cached pairs skipped, misses chunked in parallel) for every venue that precomputed
+    isochrones don't rule out. Ruled-out venues stay untimed (nan)."""
+    origins = candidates.origins
+    destinations = candidates.locations(rows)
+    if street_graph is not None:
+        # Duration values are in seconds, convert to minutes
+        with metrics.stage("walk_times"):
+            candidates.mins[rows] = street_graph.walking_matrix(origins, destinations, limit_m=max_mins * WALK_SPEED).T / 60
+        return
+
+    mins = np.full((len(rows), len(origins)), np.nan)
+    need = np.ones(mins.shape, dtype=bool)
+    if isochrones and any(iso is not None for iso in isochrones):
+        with metrics.stage("isochrones"):
+            need[rule_out(isochrones, candidates.lat[rows], candidates.lng[rows], max_mins)] = False
+        metrics.cache_hits("isochrones", int((~need).sum()))
+
+    with metrics.stage("walk_times"):
+        # Only the venues still in play, packed into as few requests as possible across origins
+        if need.any():
+            secs, requested = cached_walking_matrix(gmaps, walk_cache, origins, destinations,
+                                                    list(candidates.place_id[rows]), need=need.T)
+            mins[need] = (secs.T / 60)[need]
+            metrics.cache_hits("walk_times", int(need.sum()) - requested)
+    candidates.mins[rows] = mins
+
+
+def triangulate_stream(gmaps, locations, max_mins, min_rating, cuisines, geocode_cache, walk_cache,
+                       street_graph=None, metrics=None, previous=None, venue_index=None, rank="minimax",
+                       isochrones=None):
+    """Venues within max_mins walk of every location, rated at least min_rating, as they qualify.
+
+    Locations are addresses or autocomplete selections (see search.geocode_all).
+
+    Runs geocode -> search plan -> then, for each batch of Places results as pages arrive,
+    pruning -> walking times -> filter. Yields the result so far, {"table", "origins", "plan",
+    "candidates", "query", "metrics"}, once the plan is known and again whenever venues are
+    added; the table (see Candidates.table) is ranked by rank ("minimax" or "total", see
+    Candidates.select).
+    plan.circles is empty when the locations are too far apart to meet at all.
+
+    Given a previous result for the same locations and cuisines, its candidates are re-filtered
+    in memory: tightening the sliders makes no API calls, loosening them only times the
+    venues that newly qualify and searches Places again only past the planned coverage.
+    Given a VenueIndex, Places searches over fresh covered cells are answered from it.
+    Given an IsochroneStore, venues its isochrones rule out skip Distance Matrix, and
+    each new search counts towards its origins' popularity.
+    Stage timings and Maps usage go to metrics (a fresh SearchMetrics if not given).
+    """
+    metrics = metrics or SearchMetrics()
+    gmaps = metrics.client(gmaps)
+    terms = search_terms(cuisines)
+    query = ([location_key(loc) for loc in locations], sorted(terms, key=str))
+
+    if previous is not None and previous["query"] == query:
+        candidates = previous["candidates"]
+    else:
+        # 1. Geocode (cached across sessions, misses looked up concurrently)
+        with metrics.stage("geocode"):
+            origins = geocode_all(gmaps, geocode_cache, locations)
+        looked_up = sum(metrics.api.get(api, {}).get("requests", 0) for api in ("geocode", "place_details"))
+        metrics.cache_hits("geocode", len(locations) - looked_up)
+        if not all(origins):
+            raise AddressNotFound("One of the addresses could not be found.")
+        candidates = Candidates(origins)
+        if isochrones is not None:
+            isochrones.note_search(origins)
+    metrics.query = {"origins": candidates.origins, "terms": terms, "max_mins": max_mins}
+    isos = isochrones.lookup(candidates.origins) if isochrones is not None and street_graph is None else None
+
+    # 2. Search Area: cover the overlap of everyone's walking circles, not a circle around A
+    with metrics.stage("plan"):
+        places_mins, plan = search_plan(candidates.origins, max_mins)
+
+    result = {"table": candidates.table([]), "origins": candidates.origins, "plan": plan,
+              "candidates": candidates, "query": query, "metrics": metrics}
+
+    def refresh():
+        with metrics.stage("filter"):
+            result["table"] = candidates.table(candidates.select(max_mins, min_rating, rank))
+        return result
+
+    yield refresh()
+
+    # Venues already seen that looser filters let in, but that were never timed
+    if len(candidates):
+        with metrics.stage("prune"):
+            rows = candidates.needing_times(range(len(candidates)), max_mins, min_rating)
+        if len(rows):
+            _time_rows(gmaps, candidates, rows, max_mins, walk_cache, street_graph, metrics, isos)
+            yield refresh()
+
+    if places_mins <= candidates.searched_mins:
+        return
+
+    # One search per (area, cuisine): answered from the local venue index where it's fresh,
+    # otherwise by concurrent Places calls whose later pages arrive while earlier ones go
+    # through the steps below. Candidates deduplicate by Place ID.
+    jobs = [(c, t) for c in plan.circles for t in terms]
+    with metrics.stage("places"):
+        local = [job for job in jobs if venue_index is not None and venue_index.covered(*job)]
+    metrics.cache_hits("places", len(local))
+
+    def batches():
+        if local:
+            yield [v for job in local for v in venue_index.query(*job)]
+        yield from stream_places(gmaps, [job for job in jobs if job not in local], index=venue_index)
+
+    pages = batches()
+    while True:
+        with metrics.stage("places"):
+            venues = next(pages, None)
+        if venues is None:
+            break
+
+        # Drop low-rated and out-of-reach venues for free before the matrix call
+        with metrics.stage("prune"):
+            rows = candidates.needing_times(candidates.add(venues), max_mins, min_rating)
+        if len(rows):
+            # 3. Filter by Walk Time
+            _time_rows(gmaps, candidates, rows, max_mins, walk_cache, street_graph, metrics, isos)
+            yield refresh()
+    # Set before the last snapshot, so coalesced followers also know this area was searched
+    candidates.searched_mins = places_mins
+    yield refresh()
+
+
+def search_key(locations, max_mins, min_rating, cuisines, rank="minimax"):
+    """Identifies searches that return the same result, whoever runs them."""
+    terms = tuple(sorted(search_terms(cuisines), key=str))
+    return tuple(location_key(loc) for loc in locations), int(max_mins), float(min_rating), terms, rank
+
+
+def share_result(result):
+    """A copy of a result that another session can own; metrics stay with the search that ran."""
+    return {**result, "candidates": result["candidates"].copy(), "metrics": None}
+
+
+def coalesced_triangulate_stream(flights, gmaps, locations, max_mins, min_rating, cuisines, geocode_cache,
+                                 walk_cache, street_graph=None, metrics=None, previous=None, venue_index=None,
+                                 rank="minimax", isochrones=None):
+    """triangulate_stream, run once for identical searches from any session via a SingleFlight.
+
+    A search that joins one already running (or just finished) gets copies of its results
+    with its own metrics attached, which record the join as a "coalesced" cache hit.
+    """
+    metrics = metrics or SearchMetrics()
+    key = search_key(locations, max_mins, min_rating, cuisines, rank)
+
+    def run():
+        return triangulate_stream(gmaps, locations, max_mins, min_rating, cuisines, geocode_cache, walk_cache,
+                                  street_graph, metrics, previous, venue_index, rank, isochrones)
+
+    joined = False
+    for result in flights.stream(key, run, share_result):
+        if result["metrics"] is None:
+            if not joined:
+                metrics.cache_hits("coalesced", 1)
+                metrics.query = {"origins": result["origins"], "terms": list(key[3]), "max_mins": max_mins}
+                joined = True
+            result["metrics"] = metrics
+        yield result
+
+
+def triangulate(gmaps, locations, max_mins, min_rating, cuisines, geocode_cache, walk_cache,
+                street_graph=None, metrics=None, previous=None, venue_index=None, rank="minimax", isochrones=None):
+    """The final result of triangulate_stream; the table is empty when nothing qualifies."""
+    for result in triangulate_stream(gmaps, locations, max_mins, min_rating, cuisines, geocode_cache,
+                                     walk_cache, street_graph, metrics, previous, venue_index, rank, isochrones):
+        pass
+    return result
@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+# Google's walking pace is ~5 km/h; straight-line reach adds a small margin on top
+WALK_SPEED = 80  # metres per minute
+REACH_MARGIN = 1.15
+
+
+def walk_reach(max_mins):
+    """Straight-line metres that can't be exceeded on foot in max_mins."""
+    return max_mins * WALK_SPEED * REACH_MARGIN
+
+
+def to_local(lat, lng, center):
+    """Projects lat/lng (scalars or arrays) to x/y metres around center (equirectangular)."""
+    lat0, lng0 = math.radians(center['lat']), math.radians(center['lng'])
+    x = (np.radians(lng) - lng0) * math.cos(lat0) * EARTH_RADIUS_M
+    y = (np.radians(lat) - lat0) * EARTH_RADIUS_M
+    return x, y
+
+
+def from_local(x, y, center):
+    """Inverse of to_local, returns a {'lat', 'lng'} dict."""
+    lat0 = math.radians(center['lat'])
+    lat = center['lat'] + math.degrees(y / EARTH_RADIUS_M)
+    lng = center['lng'] + math.degrees(x / (EARTH_RADIUS_M * math.cos(lat0)))
+    return {"lat": float(lat), "lng": float(lng)}
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle metres between points, broadcasting over numpy arrays."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def grid_cell(lat, lng, cell_m):
+    """(row, col) of the ~cell_m square grid cell containing a point."""
+    row = math.floor(lat * EARTH_RADIUS_M * math.pi / 180 / cell_m)
+    # Columns are sized at the cell's own latitude so cells stay roughly square
+    lat_c = (row + 0.5) * cell_m / (EARTH_RADIUS_M * math.pi / 180)
+    col = math.floor(lng * EARTH_RADIUS_M * math.pi / 180 * math.cos(math.radians(lat_c)) / cell_m)
+    return row, col
+
+
+def cell_center(row, col, cell_m):
+    """Centre {'lat', 'lng'} of a grid_cell."""
+    m_per_deg = EARTH_RADIUS_M * math.pi / 180
+    lat = (row + 0.5) * cell_m / m_per_deg
+    lng = (col + 0.5) * cell_m / (m_per_deg * math.cos(math.radians(lat)))
+    return {"lat": lat, "lng": lng}
+
+
+def cells_in_circle(center, radius, cell_m):
+    """grid_cells whose centres lie within radius metres of center."""
+    m_per_deg = EARTH_RADIUS_M * math.pi / 180
+    row0, _ = grid_cell(center['lat'] - radius / m_per_deg, center['lng'], cell_m)
+    row1, _ = grid_cell(center['lat'] + radius / m_per_deg, center['lng'], cell_m)
+    cells = []
+    for row in range(row0, row1 + 1):
+        lat = cell_center(row, 0, cell_m)['lat']
+        dlng = radius / (m_per_deg * math.cos(math.radians(lat)))
+        col0 = grid_cell(lat, center['lng'] - dlng, cell_m)[1]
+        col1 = grid_cell(lat, center['lng'] + dlng, cell_m)[1]
+        for col in range(col0, col1 + 1):
+            c = cell_center(row, col, cell_m)
+            if haversine(center['lat'], center['lng'], c['lat'], c['lng']) <= radius:
+                cells.append((row, col))
+    return cells
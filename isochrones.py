@@ -0,0 +1,220 @@
+"""Precomputed walking isochrones for origins people search from often.
+
+An isochrone holds walking minutes from an origin cell to the centre of every grid cell
+within ISO_MAX_MINS. At query time a venue's minutes are read off its cell, and a venue
+whose cell time from some origin is more than NEAR_THRESHOLD_MINS past the limit is ruled
+out without Distance Matrix. Cell times are estimates, so they never rule a venue in: every
+venue still in play gets exact times.
+
+    python isochrones.py [--street-graph graph/] [--min-searches 3] [--limit 5] [--budget 200]
+
+computes the missing or stale isochrones for the most searched origins, on the street
+graph if given (free) or Distance Matrix (key from --key or $GMAPS_API_KEY). One
+isochrone is ~100 Distance Matrix requests, so a run stops before its request budget
+would be exceeded; its usage is logged with the search metrics (kind "isochrones").
+"""
+import argparse
+import io
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from cache import CACHE_DIR
+from geo import WALK_SPEED, cell_center, cells_in_circle, grid_cell, walk_reach
+from matrix import WALK_CELL_M, plan_blocks, walking_matrix
+from metrics import SearchMetrics, log_search
+
+# The walking slider's maximum
+ISO_MAX_MINS = 30
+# Isochrone cells (metres); a venue is at most ~0.7 cell from its cell's centre
+ISO_CELL_M = 100
+# Cell times can be ~1 min off a venue's own, so only times this far past the limit rule it out
+NEAR_THRESHOLD_MINS = 2
+ISO_TTL = 30 * 24 * 3600
+# Origins searched at least this often get an isochrone
+POPULAR_SEARCHES = 3
+# Most isochrones and Distance Matrix requests per refresh run (the daily quota is 500)
+REFRESH_LIMIT = 5
+REFRESH_BUDGET = int(os.environ.get("MEETUP_ISOCHRONE_BUDGET", 200))
+
+
+def _origin_cell(location):
+    # Same snapping as the walking-time cache: everyone in a cell shares its isochrone
+    return grid_cell(location['lat'], location['lng'], WALK_CELL_M)
+
+
+class Isochrone:
+    """Walking minutes from one origin cell to every isochrone cell around it.
+
+    inf marks cells known to be beyond ISO_MAX_MINS; nan marks cells with no answer.
+    """
+
+    def __init__(self, rows, cols, mins, cell_m=ISO_CELL_M):
+        self.cell_m = cell_m
+        self.rows, self.cols, self.mins = rows, cols, mins
+        self._mins = dict(zip(zip(rows.tolist(), cols.tolist()), mins.tolist()))
+
+    def minutes(self, lats, lngs):
+        """Cell minutes for each point; nan outside the isochrone or where it has no answer."""
+        return np.array([self._mins.get(grid_cell(lat, lng, self.cell_m), np.nan) for lat, lng in zip(lats, lngs)])
+
+    def to_bytes(self):
+        buf = io.BytesIO()
+        np.savez_compressed(buf, rows=self.rows, cols=self.cols, mins=self.mins)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data, cell_m):
+        npz = np.load(io.BytesIO(data))
+        return cls(npz["rows"], npz["cols"], npz["mins"], cell_m)
+
+
+def _cells(origin, cell_m):
+    center = cell_center(*_origin_cell(origin), WALK_CELL_M)
+    return center, cells_in_circle(center, walk_reach(ISO_MAX_MINS), cell_m)
+
+
+def matrix_requests(origin, cell_m=ISO_CELL_M):
+    """Distance Matrix requests compute() makes for the origin without a street graph."""
+    _, cells = _cells(origin, cell_m)
+    _, d_size = plan_blocks(1, len(cells))
+    return math.ceil(len(cells) / d_size)
+
+
+def compute(origin, gmaps=None, street_graph=None, cell_m=ISO_CELL_M):
+    """The isochrone of the origin's cell, walked on the street graph if given, else by Distance Matrix."""
+    center, cells = _cells(origin, cell_m)
+    targets = [cell_center(row, col, cell_m) for row, col in cells]
+    if street_graph is not None:
+        secs = street_graph.walking_matrix([center], targets, limit_m=ISO_MAX_MINS * WALK_SPEED)[0]
+        # The graph walked everything within the limit, so what it didn't reach is beyond it
+        mins = np.where(np.isnan(secs), np.inf, secs / 60)
+    else:
+        mins = walking_matrix(gmaps, [center], targets)[0] / 60
+    rows, cols = (np.array(v, dtype=np.int32) for v in zip(*cells))
+    return Isochrone(rows, cols, mins.astype(np.float32), cell_m)
+
+
+def rule_out(isochrones, lats, lngs, max_mins):
+    """True for each venue whose cell time from some origin with an isochrone is beyond
+    max_mins by more than NEAR_THRESHOLD_MINS, so it can't qualify whatever its exact time."""
+    out = np.zeros(len(lats), dtype=bool)
+    for iso in isochrones:
+        if iso is not None:
+            with np.errstate(invalid="ignore"):
+                out |= iso.minutes(lats, lngs) > max_mins + NEAR_THRESHOLD_MINS
+    return out
+
+
+class IsochroneStore:
+    """Isochrones and per-origin search counts on SQLite; shared by every session."""
+
+    def __init__(self, path=None, ttl=ISO_TTL, cell_m=ISO_CELL_M):
+        self.ttl = ttl
+        self.cell_m = cell_m
+        self._lock = threading.Lock()
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "isochrones.sqlite3")
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS isochrones ("
+            "row INTEGER, col INTEGER, cell_m INTEGER, data BLOB, computed REAL, PRIMARY KEY (row, col, cell_m));"
+            "CREATE TABLE IF NOT EXISTS demand ("
+            "row INTEGER, col INTEGER, lat REAL, lng REAL, searches INTEGER, last REAL, PRIMARY KEY (row, col));"
+        )
+
+    def note_search(self, origins):
+        """Counts a search from each origin's cell, for popular()."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO demand VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (row, col) DO UPDATE SET searches = searches + 1, last = excluded.last",
+                [(*_origin_cell(o), o['lat'], o['lng'], now) for o in origins],
+            )
+
+    def lookup(self, origins):
+        """A fresh Isochrone or None for each origin."""
+        since = time.time() - self.ttl
+        out = []
+        with self._lock:
+            for o in origins:
+                found = self._db.execute(
+                    "SELECT data FROM isochrones WHERE row = ? AND col = ? AND cell_m = ? AND computed >= ?",
+                    (*_origin_cell(o), self.cell_m, since),
+                ).fetchone()
+                out.append(Isochrone.from_bytes(found[0], self.cell_m) if found else None)
+        return out
+
+    def put(self, origin, isochrone):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO isochrones VALUES (?, ?, ?, ?, ?)",
+                             (*_origin_cell(origin), self.cell_m, isochrone.to_bytes(), time.time()))
+
+    def popular(self, min_searches=POPULAR_SEARCHES, limit=REFRESH_LIMIT):
+        """Most searched origins whose isochrone is missing or stale, busiest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT d.lat, d.lng FROM demand d LEFT JOIN isochrones i "
+                "ON i.row = d.row AND i.col = d.col AND i.cell_m = ? AND i.computed >= ? "
+                "WHERE d.searches >= ? AND i.row IS NULL ORDER BY d.searches DESC LIMIT ?",
+                (self.cell_m, time.time() - self.ttl, min_searches, limit),
+            ).fetchall()
+        return [{"lat": lat, "lng": lng} for lat, lng in rows]
+
+
+def refresh(store, gmaps=None, street_graph=None, min_searches=POPULAR_SEARCHES, limit=REFRESH_LIMIT,
+            budget=REFRESH_BUDGET):
+    """Computes isochrones for the popular origins that lack a fresh one; returns how many.
+
+    Without a street graph, stops before the next isochrone would take the run past budget
+    Distance Matrix requests. Maps usage is logged like a search, as kind "isochrones".
+    """
+    metrics = SearchMetrics(kind="isochrones")
+    if gmaps is not None:
+        gmaps = metrics.client(gmaps)
+    done = 0
+    try:
+        for origin in store.popular(min_searches, limit):
+            spent = metrics.api.get("distance_matrix", {}).get("requests", 0)
+            if street_graph is None and spent + matrix_requests(origin, store.cell_m) > budget:
+                break
+            with metrics.stage("isochrones"):
+                store.put(origin, compute(origin, gmaps, street_graph, store.cell_m))
+            done += 1
+    finally:
+        log_search(metrics)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--key", default=os.environ.get("GMAPS_API_KEY"))
+    parser.add_argument("--street-graph", help="walk on a local street graph instead of Distance Matrix")
+    parser.add_argument("--min-searches", type=int, default=POPULAR_SEARCHES)
+    parser.add_argument("--limit", type=int, default=REFRESH_LIMIT, help="most isochrones to compute this run")
+    parser.add_argument("--budget", type=int, default=REFRESH_BUDGET, help="most Distance Matrix requests to spend")
+    args = parser.parse_args(argv)
+
+    gmaps = street_graph = None
+    if args.street_graph:
+        from streetgraph import StreetGraph
+        street_graph = StreetGraph(args.street_graph)
+    elif args.key:
+        from throttle import make_client
+        gmaps = make_client(args.key)
+    else:
+        parser.error("need --street-graph or a Google Maps API key (--key or $GMAPS_API_KEY)")
+    n = refresh(IsochroneStore(), gmaps, street_graph, args.min_searches, args.limit, args.budget)
+    print(f"computed {n} isochrone(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
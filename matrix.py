@@ -0,0 +1,154 @@
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from geo import grid_cell
+
+log = logging.getLogger(__name__)
+
+# Distance Matrix per-request limits
+MAX_ORIGINS = 25
+MAX_DESTINATIONS = 25
+MAX_ELEMENTS = 100
+
+MATRIX_MAX_IN_FLIGHT = 4
+
+# Origins are snapped to cells this size (metres) for the walking-time cache
+WALK_CELL_M = 50
+
+
+def _fetch_chunk(gmaps, origins, destinations):
+    """One distance_matrix request as an origins x destinations array.
+
+    Retries are the client's job (see throttle.ThrottledClient), per request, so a failed
+    block is re-sent on its own.
+    """
+    dm = gmaps.distance_matrix(origins=origins, destinations=destinations, mode="walking")
+    out = np.full((len(origins), len(destinations)), np.nan)
+    for i, row in enumerate(dm['rows']):
+        for j, el in enumerate(row['elements']):
+            if el.get('status', 'OK') == 'OK' and 'duration' in el:
+                out[i, j] = el['duration']['value']
+    return out
+
+
+def plan_blocks(n_origins, n_destinations):
+    """(origins, destinations) per request that cover the matrix in the fewest requests.
+
+    Every request must fit the per-request limits; among the block shapes that do, take
+    the one needing the fewest requests (ties go to fewer origin blocks).
+    """
+    best = None
+    for o in range(1, min(n_origins, MAX_ORIGINS) + 1):
+        d = max(1, min(MAX_DESTINATIONS, MAX_ELEMENTS // o, n_destinations))
+        o_blocks = math.ceil(n_origins / o)
+        cost = (o_blocks * math.ceil(n_destinations / d), o_blocks)
+        if best is None or cost < best[0]:
+            best = (cost, o, d)
+    return best[1], best[2]
+
+
+def _request_count(n_origins, n_destinations):
+    o_size, d_size = plan_blocks(n_origins, n_destinations)
+    return math.ceil(n_origins / o_size) * math.ceil(n_destinations / d_size)
+
+
+def _tiles(rows, cols):
+    """(origin indices, destination indices) per request covering rows x cols, per plan_blocks."""
+    o_size, d_size = plan_blocks(len(rows), len(cols))
+    return [(rows[i:i + o_size], cols[j:j + d_size])
+            for i in range(0, len(rows), o_size) for j in range(0, len(cols), d_size)]
+
+
+def _fetch_tiles(gmaps, origins, destinations, tiles, out, max_in_flight):
+    """Fetches every tile on one fixed-size pool, each into its own cells of out."""
+    with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(tiles)))) as pool:
+        futures = [
+            (rows, cols, pool.submit(_fetch_chunk, gmaps, [origins[i] for i in rows], [destinations[j] for j in cols]))
+            for rows, cols in tiles
+        ]
+        for rows, cols, future in futures:
+            out[np.ix_(rows, cols)] = future.result()
+
+
+def walking_matrix(gmaps, origins, destinations, max_in_flight=MATRIX_MAX_IN_FLIGHT):
+    """Walking seconds from every origin to every destination (nan where there's no route).
+
+    The matrix is tiled into origin x destination blocks by plan_blocks and the blocks are
+    fetched in parallel; each block lands in its own cells.
+    """
+    result = np.full((len(origins), len(destinations)), np.nan)
+    if not origins or not destinations:
+        return result
+    tiles = _tiles(list(range(len(origins))), list(range(len(destinations))))
+    log.info("matrix plan: %d x %d in %d request(s)", len(origins), len(destinations), len(tiles))
+    _fetch_tiles(gmaps, origins, destinations, tiles, result, max_in_flight)
+    return result
+
+
+def pack_pairs(missing):
+    """Requests, as (origin indices, destination indices), that cover every True pair of missing.
+
+    Destinations missing the same origins form a group, and groups are merged greedily
+    whenever that saves a request, so a partly warm cache doesn't fragment into one call
+    per pattern. A merged request may re-fetch a few pairs that were already known.
+    """
+    groups = {}
+    for j in np.flatnonzero(missing.any(axis=0)):
+        groups.setdefault(tuple(np.flatnonzero(missing[:, j]).tolist()), []).append(int(j))
+    batches = []  # [origin set, destination list]
+    for rows, cols in sorted(groups.items(), key=lambda g: -len(g[0]) * len(g[1])):
+        alone = _request_count(len(rows), len(cols))
+        best = None
+        for batch in batches:
+            merged = len(batch[0] | set(rows))
+            added = _request_count(merged, len(batch[1]) + len(cols)) - _request_count(len(batch[0]), len(batch[1]))
+            if added < alone and (best is None or added < best[0]):
+                best = (added, batch)
+        if best is None:
+            batches.append([set(rows), list(cols)])
+        else:
+            best[1][0].update(rows)
+            best[1][1].extend(cols)
+    return [tile for rows, cols in batches for tile in _tiles(sorted(rows), cols)]
+
+
+def cached_walking_matrix(gmaps, cache, origins, destinations, place_ids, need=None, cell_m=WALK_CELL_M,
+                          max_in_flight=MATRIX_MAX_IN_FLIGHT):
+    """walking_matrix that reads through a cache keyed on (origin grid cell, destination place_id).
+
+    Only pairs marked in need (origins x destinations, default all) are looked up; the ones
+    the cache misses are packed into as few requests as pack_pairs can manage and fetched
+    on one fixed-size pool. Returns (seconds, number of needed pairs the cache missed);
+    pairs not needed stay nan unless a packed request happened to cover them.
+    """
+    if need is None:
+        need = np.ones((len(origins), len(destinations)), dtype=bool)
+    cells = ["%d:%d" % grid_cell(o['lat'], o['lng'], cell_m) for o in origins]
+    keys = [[f"{cell}:{pid}" for pid in place_ids] for cell in cells]
+    found = cache.get_many(keys[i][j] for i, j in zip(*np.nonzero(need)))
+
+    result = np.full((len(origins), len(destinations)), np.nan)
+    missing = need.copy()
+    for i, j in zip(*np.nonzero(need)):
+        if keys[i][j] in found:
+            value = found[keys[i][j]]
+            result[i, j] = np.nan if value is None else value
+            missing[i, j] = False
+    if not missing.any():
+        return result, 0
+
+    tiles = pack_pairs(missing)
+    log.info("matrix plan: %d missing pair(s) in %d request(s)", int(missing.sum()), len(tiles))
+    fetched = np.full(result.shape, np.nan)
+    _fetch_tiles(gmaps, origins, destinations, tiles, fetched, max_in_flight)
+    fresh = {}
+    for rows, cols in tiles:
+        for i in rows:
+            for j in cols:
+                result[i, j] = fetched[i, j]
+                fresh[keys[i][j]] = None if np.isnan(fetched[i, j]) else float(fetched[i, j])
+    cache.set_many(fresh)
+    return result, int(missing.sum())
@@ -0,0 +1,182 @@
+"""Per-stage timing and Maps usage for each search, logged to one JSONL file per day.
+
+    python metrics.py            # p50/p95 per stage and quota burn, per day
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import numpy as np
+
+from cache import CACHE_DIR
+
+METRICS_DIR = os.environ.get("MEETUP_METRICS_DIR", os.path.join(CACHE_DIR, "metrics"))
+# Per-API daily quota set in Google Cloud (see maptool_readme.txt)
+DAILY_QUOTA = 500
+# The Cloud API whose quota each metered call draws on; every Places call shares one
+QUOTA_API = {
+    "geocode": "geocoding",
+    "place_details": "places",
+    "places_nearby": "places",
+    "places_autocomplete": "places",
+    "distance_matrix": "distance_matrix",
+}
+
+# Which stage each Maps API is billed to
+STAGE_API = {"geocode": "geocode", "places": "places_nearby", "walk_times": "distance_matrix"}
+
+_write_lock = threading.Lock()
+
+
+class MeteredClient:
+    """Counts requests and billed elements per API before delegating to the real client."""
+
+    def __init__(self, gmaps, metrics):
+        self._gmaps = gmaps
+        self._metrics = metrics
+
+    def geocode(self, address):
+        self._metrics.count("geocode")
+        return self._gmaps.geocode(address)
+
+    def place(self, place_id, **kwargs):
+        self._metrics.count("place_details")
+        return self._gmaps.place(place_id, **kwargs)
+
+    def places_autocomplete(self, input_text, **kwargs):
+        self._metrics.count("places_autocomplete")
+        return self._gmaps.places_autocomplete(input_text, **kwargs)
+
+    def places_nearby(self, **kwargs):
+        self._metrics.count("places_nearby")
+        return self._gmaps.places_nearby(**kwargs)
+
+    def distance_matrix(self, origins, destinations, **kwargs):
+        self._metrics.count("distance_matrix", len(origins) * len(destinations))
+        return self._gmaps.distance_matrix(origins=origins, destinations=destinations, **kwargs)
+
+
+class SearchMetrics:
+    """Wall time and cache hits per stage plus requests/elements per API for one search."""
+
+    def __init__(self, kind="search"):
+        # "search" for user searches; autocomplete and background jobs ("prefetch", "isochrones")
+        # log under their own kind
+        self.kind = kind
+        self.stages = {}
+        self.api = {}
+        # What was searched ({"origins", "terms", "max_mins"}); the log doubles as a query log
+        self.query = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Streamed stages run once per batch, so their time adds up
+            stage = self.stages.setdefault(name, {})
+            stage["ms"] = stage.get("ms", 0) + (time.perf_counter() - start) * 1000
+
+    def cache_hits(self, name, hits):
+        stage = self.stages.setdefault(name, {})
+        stage["cache_hits"] = stage.get("cache_hits", 0) + hits
+
+    def count(self, api, elements=1):
+        with self._lock:
+            usage = self.api.setdefault(api, {"requests": 0, "elements": 0})
+            usage["requests"] += 1
+            usage["elements"] += elements
+
+    def client(self, gmaps):
+        return MeteredClient(gmaps, self)
+
+    def rows(self):
+        """One row per stage, with the usage of the API billed to it."""
+        rows = []
+        for name, stage in self.stages.items():
+            usage = self.api.get(STAGE_API.get(name), {})
+            rows.append({
+                "Stage": name,
+                "ms": round(stage.get("ms", 0), 1),
+                "Requests": usage.get("requests", 0),
+                "Elements": usage.get("elements", 0),
+                "Cache hits": stage.get("cache_hits", 0),
+            })
+        return rows
+
+    def to_dict(self):
+        return {"ts": time.time(), "kind": self.kind, "stages": self.stages, "api": self.api, "query": self.query}
+
+
+def log_search(metrics):
+    """Appends a search's (or background job's) metrics to today's file."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{date.today().isoformat()}.jsonl")
+    line = json.dumps(metrics.to_dict())
+    with _write_lock, open(path, "a") as f:
+        f.write(line + "\n")
+
+
+def _read(day):
+    path = os.path.join(METRICS_DIR, f"{day}.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recent_queries(days=7):
+    """The query of every logged search over the last days days, today first."""
+    queries = []
+    for n in range(days):
+        day = (date.today() - timedelta(days=n)).isoformat()
+        queries += [rec["query"] for rec in _read(day) if rec.get("query")]
+    return queries
+
+
+def quota_burn(day=None, kind=None):
+    """{quota: {"requests", "elements", "calls"}} summed over a day's records (today by default).
+
+    Calls are grouped by the quota they draw on (see QUOTA_API); "calls" splits the requests
+    by client method. Given a kind, only records of that kind count.
+    """
+    burn = {}
+    for rec in _read(day or date.today().isoformat()):
+        if kind is not None and rec.get("kind", "search") != kind:
+            continue
+        for api, usage in rec["api"].items():
+            total = burn.setdefault(QUOTA_API.get(api, api), {"requests": 0, "elements": 0, "calls": {}})
+            total["requests"] += usage["requests"]
+            total["elements"] += usage["elements"]
+            total["calls"][api] = total["calls"].get(api, 0) + usage["requests"]
+    return burn
+
+
+def summarize(day):
+    records = _read(day)
+    searches = [rec for rec in records if rec.get("kind", "search") == "search"]
+    print(f"{day}: {len(searches)} searches, {len(records) - len(searches)} other usage record(s) "
+          f"(autocomplete, background jobs)")
+    stage_ms = {}
+    for rec in searches:
+        for name, stage in rec["stages"].items():
+            stage_ms.setdefault(name, []).append(stage.get("ms", 0))
+    for name, values in stage_ms.items():
+        print(f"  {name:<12} p50 {np.percentile(values, 50):8.1f} ms   p95 {np.percentile(values, 95):8.1f} ms")
+    for quota, usage in quota_burn(day).items():
+        calls = ", ".join(f"{api} {n}" for api, n in usage["calls"].items())
+        print(f"  {quota:<16} {usage['requests']:>5} requests ({usage['requests'] / DAILY_QUOTA:.0%} of quota: "
+              f"{calls}), {usage['elements']} elements")
+
+
+if __name__ == "__main__":
+    days = sys.argv[1:] or sorted(os.path.basename(p)[:-6] for p in glob.glob(os.path.join(METRICS_DIR, "*.jsonl")))
+    for day in days:
+        summarize(day)
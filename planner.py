@@ -0,0 +1,91 @@
+import logging
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from geo import from_local, to_local
+
+log = logging.getLogger(__name__)
+
+# A plan is accepted once this share of its searched area lies inside the overlap
+TARGET_EFFICIENCY = 0.5
+MAX_CIRCLES = 3
+GRID_STEPS = 60
+
+Circle = namedtuple("Circle", "location radius")
+SearchPlan = namedtuple("SearchPlan", "circles overlap_area searched_area naive_area")
+
+
+def plan_search(origins, reach, naive_radius, max_circles=MAX_CIRCLES):
+    """Covers the overlap of the walking circles around every origin with few Places circles.
+
+    The overlap is sampled on a grid, then split into 1..max_circles slices along its long
+    axis; the smallest split whose circles are at least TARGET_EFFICIENCY overlap wins.
+    An empty overlap gives an empty plan: no venue can be walkable from every origin.
+    """
+    center = {"lat": float(np.mean([o['lat'] for o in origins])), "lng": float(np.mean([o['lng'] for o in origins]))}
+    ox, oy = to_local(np.array([o['lat'] for o in origins]), np.array([o['lng'] for o in origins]), center)
+    naive_area = math.pi * naive_radius ** 2
+
+    # Sample the bounding box shared by all circles, keep points inside every circle
+    x0, x1 = (ox - reach).max(), (ox + reach).min()
+    y0, y1 = (oy - reach).max(), (oy + reach).min()
+    if x0 >= x1 or y0 >= y1:
+        return SearchPlan([], 0.0, 0.0, naive_area)
+    step = 2 * reach / GRID_STEPS
+    gx, gy = np.meshgrid(np.arange(x0, x1 + step, step), np.arange(y0, y1 + step, step))
+    gx, gy = gx.ravel(), gy.ravel()
+    inside = ((gx[:, None] - ox) ** 2 + (gy[:, None] - oy) ** 2 <= reach ** 2).all(axis=1)
+    px, py = gx[inside], gy[inside]
+    if not len(px):
+        return SearchPlan([], 0.0, 0.0, naive_area)
+    overlap_area = len(px) * step ** 2
+
+    # Long axis of the overlap (principal component of the sample points)
+    pts = np.column_stack([px - px.mean(), py - py.mean()])
+    axis = np.linalg.eigh(pts.T @ pts)[1][:, -1] if len(px) > 1 else np.array([1.0, 0.0])
+    along = pts @ axis
+
+    best = None
+    for k in range(1, max_circles + 1):
+        edges = np.linspace(along.min(), along.max(), k + 1)
+        slot = np.clip(np.searchsorted(edges, along, side="right") - 1, 0, k - 1)
+        circles = []
+        for s in range(k):
+            sx, sy = px[slot == s], py[slot == s]
+            if not len(sx):
+                continue
+            cx, cy = (sx.min() + sx.max()) / 2, (sy.min() + sy.max()) / 2
+            # Pad by half a grid cell diagonal so the sampled edge is fully covered
+            r = float(np.sqrt((sx - cx) ** 2 + (sy - cy) ** 2).max() + step * 0.71)
+            circles.append(Circle(from_local(cx, cy, center), r))
+        plan = SearchPlan(circles, overlap_area, sum(math.pi * c.radius ** 2 for c in circles), naive_area)
+        if best is None or plan.searched_area < best.searched_area:
+            best = plan
+        if overlap_area / plan.searched_area >= TARGET_EFFICIENCY:
+            break
+
+    log.info(
+        "search plan: %d circle(s), %.2f km² searched for %.2f km² overlap (naive single circle: %.2f km²)",
+        len(best.circles), best.searched_area / 1e6, overlap_area / 1e6, naive_area / 1e6,
+    )
+    return best
+
+
+def tile_circle(circle, radius):
+    """Circles of the given radius that together cover circle, nearest its centre first.
+
+    Centres sit on a triangular lattice sqrt(3) * radius apart, which covers the plane;
+    only those whose circle reaches into circle are kept.
+    """
+    step = math.sqrt(3) * radius
+    n = int(math.ceil((circle.radius + radius) / step)) + 1
+    tiles = []
+    for j in range(-n, n + 1):
+        for i in range(-n, n + 1):
+            x, y = (i + (j % 2) / 2) * step, j * step * math.sqrt(3) / 2
+            d = math.hypot(x, y)
+            if d <= circle.radius + radius:
+                tiles.append((d, Circle(from_local(x, y, circle.location), radius)))
+    return [c for _, c in sorted(tiles, key=lambda t: t[0])]
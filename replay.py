@@ -0,0 +1,142 @@
+"""Record/replay stand-in for the Geocoding, Place Details, Places Nearby and Distance Matrix calls.
+
+RecordingClient wraps a real googlemaps.Client and appends every answer to a JSONL file
+({"method", "args", "response"} per line); ReplayClient serves those answers back with
+injected latency and errors, so the pipeline can be load-tested without spending quota.
+"""
+import json
+import random
+import threading
+import time
+
+from googlemaps.exceptions import TransportError
+
+METHODS = ("geocode", "place", "places_nearby", "distance_matrix")
+
+
+def _point(p):
+    return (round(p['lat'], 6), round(p['lng'], 6))
+
+
+def _key(method, args):
+    if method == "geocode":
+        return (method, args["address"])
+    if method == "place":
+        return (method, args["place_id"])
+    if method == "places_nearby":
+        if args.get("page_token"):
+            return (method, args["page_token"])
+        # Radii are floats from the planner; centimetres are plenty
+        return (method, _point(args["location"]), round(args["radius"], 2), args.get("keyword"))
+    raise ValueError(method)
+
+
+class RecordingClient:
+    """Passes calls through to a real client and records each request/response pair."""
+
+    def __init__(self, gmaps, path):
+        self._gmaps = gmaps
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+    def _record(self, method, args, response):
+        with self._lock:
+            self._file.write(json.dumps({"method": method, "args": args, "response": response}) + "\n")
+            self._file.flush()
+        return response
+
+    def geocode(self, address):
+        return self._record("geocode", {"address": address}, self._gmaps.geocode(address))
+
+    def place(self, place_id, session_token=None, fields=None):
+        args = {"place_id": place_id, "fields": fields}
+        response = self._gmaps.place(place_id, session_token=session_token, fields=fields)
+        return self._record("place", args, response)
+
+    def places_nearby(self, location=None, radius=None, type=None, keyword=None, page_token=None):
+        if page_token:
+            args = {"page_token": page_token}
+        else:
+            args = {"location": location, "radius": radius, "type": type, "keyword": keyword}
+        return self._record("places_nearby", args, self._gmaps.places_nearby(**args))
+
+    def distance_matrix(self, origins, destinations, mode=None):
+        args = {"origins": origins, "destinations": destinations, "mode": mode}
+        return self._record("distance_matrix", args, self._gmaps.distance_matrix(**args))
+
+
+class ReplayClient:
+    """Serves recorded responses with latency (seconds, +/- jitter) and a random error rate.
+
+    Distance Matrix answers are indexed per element, so any chunking of the same pairs
+    replays. Unrecorded requests get an empty/NOT_FOUND answer and count as misses.
+    """
+
+    def __init__(self, path, latency=0.15, jitter=0.05, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = dict.fromkeys(METHODS, 0)
+        self.misses = dict.fromkeys(METHODS, 0)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._answers = {}
+        self._elements = {}
+        with open(path) as f:
+            for line in f:
+                rec = json.loads(line)
+                args, response = rec["args"], rec["response"]
+                if rec["method"] == "distance_matrix":
+                    for o, row in zip(args["origins"], response["rows"]):
+                        for d, el in zip(args["destinations"], row["elements"]):
+                            self._elements[(_point(o), _point(d))] = el
+                else:
+                    self._answers[_key(rec["method"], args)] = response
+
+    def _call(self, method):
+        with self._lock:
+            self.calls[method] += 1
+            delay = max(0.0, self._rng.uniform(self.latency - self.jitter, self.latency + self.jitter))
+            fail = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            raise TransportError(f"injected {method} failure")
+
+    def _miss(self, method):
+        with self._lock:
+            self.misses[method] += 1
+
+    def geocode(self, address):
+        self._call("geocode")
+        key = _key("geocode", {"address": address})
+        if key not in self._answers:
+            self._miss("geocode")
+        return self._answers.get(key, [])
+
+    def place(self, place_id, session_token=None, fields=None):
+        self._call("place")
+        key = _key("place", {"place_id": place_id})
+        if key not in self._answers:
+            self._miss("place")
+        return self._answers.get(key, {"status": "NOT_FOUND"})
+
+    def places_nearby(self, location=None, radius=None, type=None, keyword=None, page_token=None):
+        self._call("places_nearby")
+        key = _key("places_nearby", {"location": location, "radius": radius, "keyword": keyword, "page_token": page_token})
+        if key not in self._answers:
+            self._miss("places_nearby")
+        return self._answers.get(key, {"results": [], "status": "ZERO_RESULTS"})
+
+    def distance_matrix(self, origins, destinations, mode=None):
+        self._call("distance_matrix")
+        rows = []
+        for o in origins:
+            elements = []
+            for d in destinations:
+                el = self._elements.get((_point(o), _point(d)))
+                if el is None:
+                    self._miss("distance_matrix")
+                    el = {"status": "NOT_FOUND"}
+                elements.append(el)
+            rows.append({"elements": elements})
+        return {"rows": rows, "status": "OK"}
@@ -0,0 +1,180 @@
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from googlemaps.exceptions import ApiError
+
+from planner import tile_circle
+from venues import PLACES_RESULT_CAP
+
+# Cap on concurrent Places requests per search
+PLACES_MAX_IN_FLIGHT = 8
+
+# Places returns up to 3 pages of 20; a next_page_token becomes valid ~2 s after it's issued
+MAX_PAGES = 3
+PAGE_TOKEN_DELAY = 2.0
+TOKEN_RETRIES = 3
+# A job that hits Places' result cap is searched again as tiles this size (or half its own
+# radius if smaller), so the venue index can record the area as covered tile by tile
+TILE_RADIUS_M = 250
+MIN_TILE_RADIUS_M = 100
+# Most tile searches started per stream; the rest of a crowded area is tiled by later searches
+TILE_JOBS = 30
+
+
+def normalize_address(text):
+    """Cache key for an address: case, spacing and comma style don't matter."""
+    text = re.sub(r"\s*,\s*", ", ", " ".join(text.split()))
+    return text.strip(" ,.").lower()
+
+
+def location_key(location):
+    """Cache key for a typed address or a selected autocomplete prediction."""
+    if isinstance(location, dict):
+        return "place_id:" + location["place_id"]
+    return normalize_address(location)
+
+
+def _locate(gmaps, location):
+    if isinstance(location, dict):
+        # Ends the prediction's autocomplete session, so the keystrokes and this lookup bill as one
+        r = gmaps.place(location["place_id"], session_token=location.get("session_token"),
+                        fields=["geometry/location"])
+        return r.get("result", {}).get("geometry", {}).get("location")
+    r = gmaps.geocode(location)
+    return r[0]['geometry']['location'] if r else None
+
+
+def geocode_all(gmaps, cache, locations):
+    """Returns a {'lat', 'lng'} dict (or None if not found) for each location.
+
+    A location is an address or an autocomplete selection (see autocomplete.suggest), which
+    resolves by Place ID without geocoding. Reads through the shared geocode cache; misses
+    are looked up concurrently.
+    """
+    keys = [location_key(loc) for loc in locations]
+    found = cache.get_many(keys)
+    missing = {k: loc for k, loc in zip(keys, locations) if k not in found}
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+            results = dict(zip(missing, pool.map(lambda loc: _locate(gmaps, loc), missing.values())))
+        located = {k: r for k, r in results.items() if r}
+        # Don't cache failures, a typo fixed on Google's side should resolve next time
+        cache.set_many(located)
+        found.update(located)
+    return [found.get(k) for k in keys]
+
+
+def stream_places(gmaps, jobs, max_in_flight=PLACES_MAX_IN_FLIGHT, max_pages=MAX_PAGES, index=None,
+                  max_tile_jobs=TILE_JOBS):
+    """Yields lists of not-yet-seen venues as Places pages arrive, one search per (circle, keyword) job.
+
+    As soon as a page arrives its worker sets a timer for the follow-up page, which submits
+    it to the pool once the next_page_token should be valid; no worker sleeps, and page
+    chains keep going while the caller is still processing earlier pages. The first failure
+    cancels everything not yet started and is re-raised.
+
+    Given a venue index, every page is added to it and a job that got all of Places'
+    answers marks its circle as covered there. A job that hit PLACES_RESULT_CAP may have
+    missed venues, so its circle is tiled with smaller circles (tile_circle): tiles already
+    covered are answered from the index, up to max_tile_jobs others are searched (and tiled
+    again if they hit the cap too). Each tile that comes back under the cap is covered, so
+    repeated searches of a crowded area fill in its coverage until the index answers it.
+    """
+    def search(kwargs):
+        if "page_token" not in kwargs:
+            return gmaps.places_nearby(type="restaurant", **kwargs)
+        try:
+            return gmaps.places_nearby(page_token=kwargs["page_token"])
+        except ApiError as e:
+            # Token not valid yet: Google answers INVALID_REQUEST until it is
+            if e.status == "INVALID_REQUEST":
+                return {"retry": True}
+            raise
+
+    arrived = queue.Queue()  # one (job, response, followed, error) per request
+    stopped = threading.Event()
+    timers = []
+    # Threads start as needed, and capped jobs can add tile searches beyond the first jobs
+    pool = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    def submit(j, kwargs, page, attempt):
+        if stopped.is_set():
+            return
+        try:
+            pool.submit(fetch, j, kwargs, page, attempt)
+        except RuntimeError:
+            # The search finished or was abandoned while the timer ran
+            pass
+
+    def fetch(j, kwargs, page, attempt):
+        try:
+            res = search(kwargs)
+        except Exception as e:
+            arrived.put((j, None, False, e))
+            return
+        follow = None
+        if res.get("retry"):
+            if attempt < TOKEN_RETRIES:
+                follow = (1.0, kwargs, page, attempt + 1)
+        elif res.get("next_page_token") and page < max_pages:
+            follow = (PAGE_TOKEN_DELAY, {"page_token": res["next_page_token"]}, page + 1, 0)
+        if follow is not None and not stopped.is_set():
+            delay, *args = follow
+            timer = threading.Timer(delay, submit, (j, *args))
+            timer.daemon = True
+            timers.append(timer)
+            timer.start()
+        arrived.put((j, res, follow is not None, None))
+
+    jobs = list(jobs)
+    seen = set()
+    found = [0] * len(jobs)
+    tile_jobs = 0  # tile searches started so far
+
+    def fresh(venues):
+        batch = [v for v in venues if v['place_id'] not in seen]
+        seen.update(v['place_id'] for v in batch)
+        return batch
+
+    try:
+        for j, (c, t) in enumerate(jobs):
+            pool.submit(fetch, j, {"location": c.location, "radius": c.radius, "keyword": t}, 1, 0)
+        # Requests submitted or waiting on a timer whose answer hasn't been taken yet
+        outstanding = len(jobs)
+        while outstanding:
+            j, res, followed, error = arrived.get()
+            outstanding += followed - 1
+            if error is not None:
+                raise error
+            if res.get("retry"):
+                continue
+            results = res.get('results', [])
+            found[j] += len(results)
+            if index is not None:
+                index.add(results, jobs[j][1])
+            batch = fresh(results)
+            if index is not None and not followed:
+                circle, keyword = jobs[j]
+                tile_m = min(TILE_RADIUS_M, circle.radius / 2)
+                if not res.get('next_page_token') and found[j] < PLACES_RESULT_CAP:
+                    index.mark_covered(circle, keyword)
+                elif tile_m >= MIN_TILE_RADIUS_M:
+                    for tile in tile_circle(circle, tile_m):
+                        if index.covered(tile, keyword):
+                            batch += fresh(index.query(tile, keyword))
+                        elif tile_jobs < max_tile_jobs:
+                            tile_jobs += 1
+                            jobs.append((tile, keyword))
+                            found.append(0)
+                            pool.submit(fetch, len(jobs) - 1,
+                                        {"location": tile.location, "radius": tile.radius, "keyword": keyword}, 1, 0)
+                            outstanding += 1
+            if batch:
+                yield batch
+    finally:
+        stopped.set()
+        for timer in timers:
+            timer.cancel()
+        pool.shutdown(cancel_futures=True)
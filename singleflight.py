@@ -0,0 +1,116 @@
+"""Coalesces identical streamed work across sessions: one run per key at a time, its
+snapshots shared with everyone who asks for the same key meanwhile or shortly after."""
+import threading
+import time
+
+# Seconds a finished run keeps answering identical requests
+COALESCE_WINDOW = 30
+
+
+class _Flight:
+    def __init__(self):
+        # Only the latest published snapshot is kept; version counts publications
+        self.latest = None
+        self.version = 0
+        self.followers = 0
+        self.done = False
+        self.error = None
+        self.abandoned = False
+        self.finished = None
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """Runs at most one generator per key; identical calls follow its snapshots.
+
+    One instance is meant to be shared by every session. The first caller for a key (the
+    leader) runs make() and gets its items as they come. Once anyone follows, each item is
+    also published as share(item), and the last item always is. Callers with the same key
+    while it runs, or up to window seconds after it finishes, get share() of the latest
+    published snapshot whenever a new one lands, so they never hold the leader's objects.
+    A failure reaches every follower; a leader that stops early hands the key to the next
+    caller instead.
+    """
+
+    def __init__(self, window=COALESCE_WINDOW):
+        self.window = window
+        self.leaders = 0
+        self.followers = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def stream(self, key, make, share=lambda item: item):
+        with self._lock:
+            now = time.monotonic()
+            for k in [k for k, f in self._flights.items() if f.finished is not None and now - f.finished > self.window]:
+                del self._flights[k]
+            flight = self._flights.get(key)
+            lead = flight is None
+            if lead:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+                with flight.cond:
+                    flight.followers += 1
+        if lead:
+            yield from self._lead(key, flight, make, share)
+        else:
+            yield from self._follow(key, flight, make, share)
+
+    def _finish(self, key, flight, error=None, abandoned=False):
+        if error is not None or abandoned:
+            # Only successful runs answer later requests
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+        with flight.cond:
+            flight.done = True
+            flight.error = error
+            flight.abandoned = abandoned
+            flight.finished = time.monotonic()
+            flight.cond.notify_all()
+
+    def _publish(self, flight, published):
+        with flight.cond:
+            flight.latest = published
+            flight.version += 1
+            flight.cond.notify_all()
+
+    def _lead(self, key, flight, make, share):
+        last = shared = None
+        try:
+            for last in make():
+                # Copies cost a share() per item, so they're only made once someone follows
+                shared = flight.followers > 0
+                if shared:
+                    self._publish(flight, share(last))
+                yield last
+            if shared is False:
+                # Later callers within the window are answered from the final snapshot
+                self._publish(flight, share(last))
+        except GeneratorExit:
+            self._finish(key, flight, abandoned=True)
+            raise
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight)
+
+    def _follow(self, key, flight, make, share):
+        seen = 0
+        while True:
+            with flight.cond:
+                while flight.version == seen and not flight.done:
+                    flight.cond.wait()
+                if flight.abandoned:
+                    break
+                if flight.error is not None:
+                    raise flight.error
+                if flight.version == seen:
+                    return
+                seen = flight.version
+                latest = flight.latest
+            yield share(latest)
+        # The leader stopped before finishing; take over (or join whoever already did)
+        yield from self.stream(key, make, share)
@@ -0,0 +1,205 @@
+"""Offline walking times on a local street-network extract.
+
+Build once from an OpenStreetMap XML extract, then load memory-mapped:
+
+    python streetgraph.py build city.osm graphs/city
+    python streetgraph.py compare graphs/city recorded.jsonl
+"""
+import heapq
+import json
+import math
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from geo import EARTH_RADIUS_M, WALK_SPEED, haversine
+
+WALKABLE = {
+    "footway", "path", "pedestrian", "steps", "living_street", "residential", "service",
+    "unclassified", "track", "cycleway", "corridor", "road", "tertiary", "tertiary_link",
+    "secondary", "secondary_link", "primary", "primary_link", "trunk", "trunk_link",
+}
+ARRAYS = ("lat", "lng", "indptr", "indices", "weights")
+
+# Routes searched per origin when no explicit bound is given, relative to straight-line reach
+DETOUR_FACTOR = 2.0
+# Nodes are bucketed into lat/lng cells of this many degrees (~280 m north-south) for snapping
+SNAP_CELL_DEG = 0.0025
+# Cells searched outward from a point before snapping falls back to every node
+SNAP_MAX_RING = 8
+
+
+def _cell_keys(lat, lng):
+    rows = np.floor(np.asarray(lat) / SNAP_CELL_DEG).astype(np.int64)
+    cols = np.floor(np.asarray(lng) / SNAP_CELL_DEG).astype(np.int64)
+    return (rows << 32) + cols
+
+
+def _walkable(tags):
+    if tags.get("highway") not in WALKABLE or tags.get("foot") == "no":
+        return False
+    return tags.get("access") not in ("private", "no") or tags.get("foot") in ("yes", "designated")
+
+
+def build(osm_path, out_dir):
+    """Converts an .osm XML extract into CSR arrays (edge weights in metres, both directions)."""
+    coords, ways = {}, []
+    for _, el in ET.iterparse(osm_path, events=("end",)):
+        if el.tag == "node":
+            coords[int(el.get("id"))] = (float(el.get("lat")), float(el.get("lon")))
+            el.clear()
+        elif el.tag == "way":
+            if _walkable({t.get("k"): t.get("v") for t in el.iter("tag")}):
+                ways.append([int(nd.get("ref")) for nd in el.iter("nd")])
+            el.clear()
+        elif el.tag == "relation":
+            el.clear()
+
+    used = sorted({n for way in ways for n in way if n in coords})
+    index = {n: i for i, n in enumerate(used)}
+    lat = np.array([coords[n][0] for n in used])
+    lng = np.array([coords[n][1] for n in used])
+    src, dst = [], []
+    for way in ways:
+        ids = [index[n] for n in way if n in index]
+        src.extend(ids[:-1])
+        dst.extend(ids[1:])
+    src, dst = np.array(src + dst, dtype=np.int64), np.array(dst + src, dtype=np.int64)
+    order = np.argsort(src, kind="stable")
+    src, dst = src[order], dst[order]
+
+    arrays = {
+        "lat": lat,
+        "lng": lng,
+        "indptr": np.searchsorted(src, np.arange(len(used) + 1)).astype(np.int64),
+        "indices": dst.astype(np.int32),
+        "weights": haversine(lat[src], lng[src], lat[dst], lng[dst]).astype(np.float32),
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(out_dir, f"{name}.npy"), arrays[name])
+    return len(used), len(dst)
+
+
+class StreetGraph:
+    """Walking-time engine over a graph written by build(), a drop-in for the matrix step."""
+
+    def __init__(self, path):
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        # Node ids sorted by grid cell, so a cell's nodes are one slice (built once per load)
+        keys = _cell_keys(self.lat, self.lng)
+        self._by_cell = np.argsort(keys, kind="stable")
+        self._cell_keys = keys[self._by_cell]
+
+    def snap(self, points):
+        """Nearest graph node and the straight-line metres to it, for each {'lat', 'lng'}.
+
+        Each point only looks at the nodes in the grid cells around it, so memory stays
+        small however many points or nodes there are.
+        """
+        nodes = np.empty(len(points), dtype=np.int64)
+        offsets = np.empty(len(points))
+        for i, p in enumerate(points):
+            nodes[i], offsets[i] = self._snap_point(p['lat'], p['lng'])
+        return nodes, offsets
+
+    def _snap_point(self, lat, lng):
+        row, col = math.floor(lat / SNAP_CELL_DEG), math.floor(lng / SNAP_CELL_DEG)
+        # Any node outside the ring-r block around the point's cell is at least r cell widths away
+        cell_m = SNAP_CELL_DEG * EARTH_RADIUS_M * math.pi / 180 * math.cos(math.radians(lat))
+        ring = 1
+        while ring <= SNAP_MAX_RING:
+            span = np.arange(-ring, ring + 1)
+            keys = (((row + span[:, None]) << 32) + (col + span)).ravel()
+            lo = np.searchsorted(self._cell_keys, keys, "left")
+            hi = np.searchsorted(self._cell_keys, keys, "right")
+            near = self._by_cell[np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])]
+            if len(near):
+                d = haversine(lat, lng, self.lat[near], self.lng[near])
+                best = d.argmin()
+                if d[best] <= ring * cell_m:
+                    return near[best], d[best]
+            ring *= 2
+        d = haversine(lat, lng, self.lat, self.lng)
+        best = d.argmin()
+        return best, d[best]
+
+    def walking_matrix(self, origins, destinations, limit_m=None):
+        """Walking seconds origins x destinations (nan beyond limit_m or unreachable).
+
+        One bounded Dijkstra pass expands every origin together, each with its own labels.
+        """
+        result = np.full((len(origins), len(destinations)), np.nan)
+        if not origins or not destinations:
+            return result
+        nodes, offsets = self.snap(list(origins) + list(destinations))
+        o_nodes, o_off = nodes[:len(origins)], offsets[:len(origins)]
+        d_nodes, d_off = nodes[len(origins):], offsets[len(origins):]
+        if limit_m is None:
+            olat = np.array([o['lat'] for o in origins])
+            olng = np.array([o['lng'] for o in origins])
+            dlat = np.array([d['lat'] for d in destinations])
+            dlng = np.array([d['lng'] for d in destinations])
+            limit_m = float(haversine(olat[:, None], olng[:, None], dlat, dlng).max()) * DETOUR_FACTOR
+
+        dist = [{} for _ in origins]
+        heap = [(float(o_off[i]), i, int(o_nodes[i])) for i in range(len(origins))]
+        heapq.heapify(heap)
+        while heap:
+            d, i, node = heapq.heappop(heap)
+            if node in dist[i]:
+                continue
+            dist[i][node] = d
+            lo, hi = self.indptr[node], self.indptr[node + 1]
+            for nxt, w in zip(self.indices[lo:hi].tolist(), self.weights[lo:hi].tolist()):
+                nd = d + w
+                if nd <= limit_m and nxt not in dist[i]:
+                    heapq.heappush(heap, (nd, i, nxt))
+
+        for i in range(len(origins)):
+            for j, node in enumerate(d_nodes.tolist()):
+                if node in dist[i]:
+                    result[i, j] = (dist[i][node] + d_off[j]) / WALK_SPEED * 60
+        return result
+
+
+def deviations(graph, recorded_path):
+    """Minutes the graph is off (graph minus Google) for every OK element of the
+    distance_matrix answers in a RecordingClient file that the graph can also reach."""
+    errors = []
+    with open(recorded_path) as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec.get("method") != "distance_matrix":
+                continue
+            args, dm = rec["args"], rec["response"]
+            ours = graph.walking_matrix(args["origins"], args["destinations"])
+            for i, row in enumerate(dm["rows"]):
+                for j, el in enumerate(row["elements"]):
+                    if el.get("status") == "OK" and not np.isnan(ours[i, j]):
+                        errors.append((ours[i, j] - el["duration"]["value"]) / 60)
+    return np.array(errors)
+
+
+def compare(graph_path, recorded_path):
+    """Prints how far graph walking times are from recorded distance_matrix answers."""
+    errors = deviations(StreetGraph(graph_path), recorded_path)
+    if not len(errors):
+        print("No comparable distance_matrix elements found.")
+        return
+    print(f"{len(errors)} elements, minutes off vs Distance Matrix: "
+          f"median abs {np.median(np.abs(errors)):.2f}, p90 abs {np.percentile(np.abs(errors), 90):.2f}, "
+          f"mean bias {errors.mean():+.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "build":
+        n_nodes, n_edges = build(sys.argv[2], sys.argv[3])
+        print(f"Wrote {n_nodes} nodes, {n_edges} directed edges to {sys.argv[3]}")
+    elif len(sys.argv) == 4 and sys.argv[1] == "compare":
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        sys.exit(__doc__)
@@ -0,0 +1,57 @@
+import math
+import os
+import sys
+
+import pytest
+
+# The app's modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeMaps:
+    """Deterministic stand-in for googlemaps.Client: one page of venues, straight-line walks."""
+
+    def __init__(self):
+        self.calls = {}
+
+    def _count(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+    def geocode(self, address):
+        self._count("geocode")
+        lat = 40.75 + (0.01 if "b" in address.lower() else 0)
+        return [{"geometry": {"location": {"lat": lat, "lng": -73.99}}}]
+
+    def places_nearby(self, location=None, radius=None, type=None, keyword=None, page_token=None):
+        self._count("places_nearby")
+        results = []
+        for i in range(10):
+            lat = location['lat'] + (i - 5) * 0.0005
+            results.append({"place_id": f"p{lat:.5f}", "name": f"Venue {i}", "rating": 4.5,
+                            "geometry": {"location": {"lat": lat, "lng": location['lng']}}})
+        return {"results": results}
+
+    def distance_matrix(self, origins, destinations, mode=None):
+        self._count("distance_matrix")
+        rows = []
+        for o in origins:
+            elements = []
+            for d in destinations:
+                m = math.hypot((o['lat'] - d['lat']) * 111000, (o['lng'] - d['lng']) * 85000) * 1.25
+                elements.append({"status": "OK", "duration": {"value": int(m / 80 * 60)}, "distance": {"value": int(m)}})
+            rows.append({"elements": elements})
+        return {"rows": rows}
+
+
+@pytest.fixture
+def gmaps():
+    return FakeMaps()
+
+
+@pytest.fixture
+def caches(tmp_path):
+    from cache import SqliteCache
+    return {
+        "geocode_cache": SqliteCache("geocode", 3600, 1000, path=str(tmp_path / "geocode.sqlite3")),
+        "walk_cache": SqliteCache("walk_times", 3600, 100000, path=str(tmp_path / "walk.sqlite3")),
+    }
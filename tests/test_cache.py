@@ -0,0 +1,16 @@
+from cache import EVICT_FRACTION, SqliteCache
+
+
+def test_eviction_drops_least_recently_used_in_batches(tmp_path):
+    cache = SqliteCache("test", ttl=3600, max_entries=100, path=str(tmp_path / "c.sqlite3"))
+    cache.set_many({f"k{i}": i for i in range(100)})
+    assert cache.stats()["entries"] == 100
+
+    cache.get("k0")
+    cache.set("new", 0)
+    assert cache.stats()["entries"] == 100 * (1 - EVICT_FRACTION)
+    assert cache.get_many(["k0", "new", "k1"]).keys() == {"k0", "new"}
+
+    # Below the bound again, so the next writes don't evict
+    cache.set_many({f"m{i}": i for i in range(10)})
+    assert cache.stats()["entries"] == 100
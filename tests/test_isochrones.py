@@ -0,0 +1,44 @@
+import numpy as np
+
+import metrics
+from engine import triangulate
+from geo import cell_center
+from isochrones import Isochrone, IsochroneStore, matrix_requests, refresh, rule_out
+
+ORIGIN = {"lat": 40.75, "lng": -73.99}
+
+
+def test_refresh_stays_within_budget_and_logs_usage(gmaps, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path / "metrics"))
+    store = IsochroneStore(path=str(tmp_path / "iso.sqlite3"), cell_m=400)
+    for _ in range(3):
+        store.note_search([ORIGIN])
+    cost = matrix_requests(ORIGIN, store.cell_m)
+
+    assert refresh(store, gmaps, budget=cost - 1) == 0
+    assert gmaps.calls == {}
+
+    assert refresh(store, gmaps, budget=cost) == 1
+    assert gmaps.calls["distance_matrix"] == cost
+    assert store.lookup([ORIGIN])[0] is not None
+    assert metrics.quota_burn()["distance_matrix"]["requests"] == cost
+
+
+def test_isochrones_only_rule_venues_out(gmaps, caches, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path / "metrics"))
+    store = IsochroneStore(path=str(tmp_path / "iso.sqlite3"), cell_m=400)
+    locations = ["office a", "home b"]
+    exact = triangulate(gmaps, locations, 15, 0, [], **caches)
+    for _ in range(3):
+        store.note_search(exact["origins"])
+    assert refresh(store, gmaps, budget=10_000) == 2
+
+    with_isos = triangulate(gmaps, locations, 15, 0, [], isochrones=store, **caches)
+    # Coarse cell times never stand in for a venue's own walking time
+    for column in ("place_id", "Mins from A", "Mins from B"):
+        assert list(with_isos["table"][column]) == list(exact["table"][column])
+
+    iso = Isochrone(np.array([0, 0]), np.array([0, 1]), np.array([14.0, 18.0], dtype=np.float32), cell_m=400)
+    centers = [cell_center(0, col, 400) for col in (0, 1)]
+    lats, lngs = np.array([c['lat'] for c in centers]), np.array([c['lng'] for c in centers])
+    assert list(rule_out([iso], lats, lngs, 15)) == [False, True]
@@ -0,0 +1,7 @@
+from matrix import plan_blocks
+
+
+def test_plan_blocks_ties_go_to_fewer_origin_blocks():
+    # 2 x 4 and 1 x 8 blocks both take 8 requests
+    assert plan_blocks(10, 80) == (10, 10)
+    assert plan_blocks(1, 250) == (1, 25)
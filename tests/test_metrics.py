@@ -0,0 +1,19 @@
+import metrics
+from metrics import SearchMetrics, log_search, quota_burn
+
+
+def test_places_calls_share_one_quota(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    search = SearchMetrics()
+    for api in ("places_nearby", "place_details", "geocode"):
+        search.count(api)
+    log_search(search)
+    typing = SearchMetrics(kind="autocomplete")
+    typing.count("places_autocomplete")
+    log_search(typing)
+
+    burn = quota_burn()
+    assert burn["places"]["requests"] == 3
+    assert burn["places"]["calls"] == {"places_nearby": 1, "place_details": 1, "places_autocomplete": 1}
+    assert burn["geocoding"]["requests"] == 1
+    assert quota_burn(kind="autocomplete")["places"]["requests"] == 1
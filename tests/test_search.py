@@ -0,0 +1,95 @@
+import itertools
+import time
+
+import numpy as np
+
+import search
+from engine import triangulate
+from geo import haversine
+from planner import Circle
+from venues import VenueIndex
+
+
+class PagedPlaces:
+    """Three pages per search; records when each page was requested."""
+
+    def __init__(self):
+        self.requested = {}
+
+    def places_nearby(self, page_token=None, **kwargs):
+        page = int(page_token[-1]) if page_token else 1
+        self.requested[page] = time.monotonic()
+        results = [{"place_id": f"p{page}-{i}", "geometry": {"location": {"lat": 40.75, "lng": -73.99}}}
+                   for i in range(20)]
+        return {"results": results, "next_page_token": f"token{page + 1}" if page < 3 else None}
+
+
+def test_page_requests_dont_wait_for_the_consumer(monkeypatch):
+    monkeypatch.setattr(search, "PAGE_TOKEN_DELAY", 0.05)
+    gmaps = PagedPlaces()
+    pages = search.stream_places(gmaps, [(Circle({"lat": 40.75, "lng": -73.99}, 500), None)])
+
+    first = next(pages)
+    # A consumer busy with the first page for longer than both token delays
+    time.sleep(0.5)
+    rest = [v for batch in pages for v in batch]
+
+    assert len(first) + len(rest) == 60
+    assert gmaps.requested[3] - gmaps.requested[1] < 0.4
+
+
+class DensePlaces:
+    """A restaurant every ~60 m; each search pages through up to 60 of those in its circle."""
+
+    def __init__(self):
+        self.calls = 0
+        lats, lngs = np.meshgrid(40.75 + np.arange(-20, 21) * 0.00054, -73.99 + np.arange(-20, 21) * 0.00071)
+        self.lat, self.lng = lats.ravel(), lngs.ravel()
+        self.pages = {}
+        self._tokens = itertools.count()
+
+    def places_nearby(self, location=None, radius=None, type=None, keyword=None, page_token=None):
+        self.calls += 1
+        if page_token:
+            results, rest = self.pages.pop(page_token)
+        else:
+            inside = np.flatnonzero(haversine(location['lat'], location['lng'], self.lat, self.lng) <= radius)
+            venues = [{"place_id": f"v{i}", "name": f"Venue {i}", "rating": 4.5,
+                       "geometry": {"location": {"lat": self.lat[i], "lng": self.lng[i]}}} for i in inside[:60]]
+            results, rest = venues[:20], venues[20:]
+        res = {"results": results}
+        if rest:
+            res["next_page_token"] = token = f"t{next(self._tokens)}"
+            self.pages[token] = (rest[:20], rest[20:])
+        return res
+
+
+def test_capped_searches_are_tiled_until_covered(monkeypatch, tmp_path):
+    monkeypatch.setattr(search, "PAGE_TOKEN_DELAY", 0)
+    gmaps = DensePlaces()
+    index = VenueIndex(path=str(tmp_path / "venues.sqlite3"))
+    circle = Circle({"lat": 40.75, "lng": -73.99}, 400)
+
+    found = {v['place_id'] for batch in search.stream_places(gmaps, [(circle, None)], index=index) for v in batch}
+
+    inside = haversine(40.75, -73.99, gmaps.lat, gmaps.lng) <= 400
+    assert found >= {f"v{i}" for i in np.flatnonzero(inside)}
+    assert index.covered(circle, None)
+
+
+def test_repeated_crowded_searches_end_up_answered_by_the_index(gmaps, caches, monkeypatch, tmp_path):
+    monkeypatch.setattr(search, "PAGE_TOKEN_DELAY", 0)
+    dense = DensePlaces()
+    gmaps.places_nearby = dense.places_nearby
+    index = VenueIndex(path=str(tmp_path / "venues.sqlite3"))
+
+    spent, tables = [], []
+    for _ in range(4):
+        before = dense.calls
+        result = triangulate(gmaps, ["office a", "home b"], 15, 0, [], venue_index=index, **caches)
+        spent.append(dense.calls - before)
+        tables.append(set(result["table"]["place_id"]))
+
+    # Each search tiles more of the crowded area until none is left for Places
+    assert spent[0] > spent[1] > spent[-1] == 0
+    assert all(table == tables[0] for table in tables)
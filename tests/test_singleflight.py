@@ -0,0 +1,47 @@
+from engine import coalesced_triangulate_stream
+from singleflight import SingleFlight
+
+
+def _final(stream):
+    result = None
+    for result in stream:
+        pass
+    return result
+
+
+def test_follower_gets_leaders_searched_area(gmaps, caches):
+    flights = SingleFlight()
+    args = (gmaps, ["office a", "home b"], 15, 0, [], caches["geocode_cache"], caches["walk_cache"])
+    leader = _final(coalesced_triangulate_stream(flights, *args))
+    follower = _final(coalesced_triangulate_stream(flights, *args))
+
+    assert flights.followers == 1
+    assert follower["candidates"] is not leader["candidates"]
+    assert follower["candidates"].searched_mins == leader["candidates"].searched_mins > 0
+    assert list(follower["table"]["place_id"]) == list(leader["table"]["place_id"])
+
+
+def test_follower_tightening_makes_no_calls(gmaps, caches):
+    flights = SingleFlight()
+    args = (["office a", "home b"], 15, 0, [], caches["geocode_cache"], caches["walk_cache"])
+    _final(coalesced_triangulate_stream(flights, gmaps, *args))
+    follower = _final(coalesced_triangulate_stream(flights, gmaps, *args))
+
+    gmaps.calls.clear()
+    _final(coalesced_triangulate_stream(SingleFlight(), gmaps, ["office a", "home b"], 10, 0, [],
+                                        caches["geocode_cache"], caches["walk_cache"], previous=follower))
+    assert gmaps.calls == {}
+
+
+def test_leader_alone_shares_only_its_last_item():
+    flights = SingleFlight()
+    shared = []
+
+    def share(item):
+        shared.append(item)
+        return item
+
+    assert list(flights.stream("k", lambda: iter([1, 2, 3]), share)) == [1, 2, 3]
+    assert shared == [3]
+    # A caller within the window gets the final snapshot
+    assert list(flights.stream("k", lambda: iter([]), share)) == [3]
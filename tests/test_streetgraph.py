@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pytest
+
+from geo import haversine
+from streetgraph import StreetGraph, build, deviations
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Distance Matrix durations are whole seconds along Google's own routing and pace
+TOLERANCE_MINS = 1.0
+
+
+def test_graph_minutes_match_recorded_distance_matrix(tmp_path):
+    # Four streets are walkable; the foot=no diagonal, the private lane and the motorway aren't
+    assert build(os.path.join(DATA, "tiny.osm"), str(tmp_path)) == (5, 8)
+    graph = StreetGraph(str(tmp_path))
+
+    errors = deviations(graph, os.path.join(DATA, "tiny_distance_matrix.jsonl"))
+
+    # Every OK element is compared; ZERO_RESULTS and the geocode record are skipped
+    assert len(errors) == 4
+    assert np.abs(errors).max() <= TOLERANCE_MINS
+
+
+def test_snap_finds_the_nearest_node(tmp_path):
+    build(os.path.join(DATA, "tiny.osm"), str(tmp_path))
+    graph = StreetGraph(str(tmp_path))
+    rng = np.random.default_rng(0)
+    # Around the graph and far enough out that snapping widens its search
+    points = [{"lat": 40.75 + dy, "lng": -73.987 + dx} for dy, dx in rng.uniform(-0.05, 0.05, (50, 2))]
+
+    nodes, offsets = graph.snap(points)
+
+    for p, node, offset in zip(points, nodes, offsets):
+        d = haversine(p['lat'], p['lng'], np.asarray(graph.lat), np.asarray(graph.lng))
+        assert node == d.argmin() and offset == pytest.approx(d.min())
@@ -0,0 +1,40 @@
+import pytest
+from googlemaps.exceptions import ApiError
+
+import throttle
+from throttle import ThrottledClient
+
+
+class OverLimit:
+    def __init__(self, message, fail_times=99):
+        self.message = message
+        self.fail_times = fail_times
+        self.calls = 0
+
+    def geocode(self, address):
+        self.calls += 1
+        if self.calls <= self.fail_times:
+            raise ApiError("OVER_QUERY_LIMIT", self.message)
+        return []
+
+
+def test_daily_quota_exhaustion_fails_at_once(monkeypatch):
+    monkeypatch.setattr(throttle, "BACKOFF_BASE", 0.001)
+    gmaps = OverLimit("You have exceeded your daily request quota for this API.")
+    client = ThrottledClient(gmaps)
+
+    with pytest.raises(ApiError):
+        client.geocode("a")
+    assert gmaps.calls == 1
+    assert client.stats()["throttled"] == 0
+    assert client.limits["geocode"].limit == throttle.API_MAX_IN_FLIGHT["geocode"]
+
+
+def test_rate_throttling_is_retried(monkeypatch):
+    monkeypatch.setattr(throttle, "BACKOFF_BASE", 0.001)
+    gmaps = OverLimit("You have exceeded your rate-limit for this API.", fail_times=2)
+    client = ThrottledClient(gmaps)
+
+    assert client.geocode("a") == []
+    assert gmaps.calls == 3
+    assert client.stats()["throttled"] == 2
@@ -0,0 +1,30 @@
+import metrics
+from engine import triangulate
+from metrics import SearchMetrics, log_search
+from venues import VenueIndex
+from warmup import prefetch
+
+
+def search(gmaps, caches, venue_index):
+    m = SearchMetrics()
+    triangulate(m.client(gmaps), ["Times Square", "Bryant Park"], 15, 0, [], **caches, metrics=m,
+                venue_index=venue_index)
+    log_search(m)
+    return m
+
+
+def test_prefetch_answers_the_logged_searches_within_a_daily_budget(gmaps, caches, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path / "metrics"))
+    search(gmaps, caches, None)
+
+    venue_index = VenueIndex(path=str(tmp_path / "venues.sqlite3"))
+    spent = prefetch(gmaps, venue_index, budget=50)
+    assert spent > 0
+    # The same search is now answered by the index
+    m = search(gmaps, caches, venue_index)
+    assert "places_nearby" not in m.api
+    assert m.stages["places"]["cache_hits"] > 0
+
+    # A restart the same day finds nothing left to do, and a fresh index finds no budget left
+    assert prefetch(gmaps, venue_index, budget=50) == 0
+    assert prefetch(gmaps, VenueIndex(path=str(tmp_path / "fresh.sqlite3")), budget=spent) == 0
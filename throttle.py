@@ -0,0 +1,195 @@
+"""Process-wide Maps client: pooled connections, a token bucket per API, jittered retries
+and per-API concurrency that halves when Google throttles and creeps back up after.
+
+Under load a search waits for tokens or a free slot instead of failing; only errors
+that retrying can't fix (bad request, not found, denied) reach the caller.
+"""
+import random
+import threading
+import time
+
+import googlemaps
+import requests
+from requests.adapters import HTTPAdapter
+from googlemaps.exceptions import ApiError, HTTPError, Timeout, TransportError
+
+# Sustained rate (per second) and burst per API. These are hand-picked ceilings that smooth
+# bursts, not quotas: the daily per-API quota (metrics.DAILY_QUOTA) is far lower and only
+# the quota panel watches it. Distance Matrix is metered in elements, everything else in requests.
+API_RATES = {
+    "geocode": (50, 50),
+    "place": (50, 50),
+    "places_autocomplete": (50, 100),
+    "places_nearby": (20, 40),
+    "distance_matrix": (1000, 1000),
+}
+# Most requests in flight per API; throttling halves it, each success adds back a little
+API_MAX_IN_FLIGHT = {"geocode": 8, "place": 8, "places_autocomplete": 16, "places_nearby": 16, "distance_matrix": 8}
+
+# Keep-alive connections kept open to maps.googleapis.com
+POOL_SIZE = 32
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+_THROTTLED_STATUSES = {"OVER_QUERY_LIMIT", "RESOURCE_EXHAUSTED"}
+# Google reuses those statuses once the daily quota is spent ("...exceeded your daily request
+# quota...", "...per day..."), which no backoff within the day can fix
+_DAILY_QUOTA_HINTS = ("daily", "per day")
+_RETRIABLE_HTTP = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Refills at rate tokens per second up to burst; take() blocks until enough are in."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, n=1):
+        n = min(n, self.burst)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    """Concurrency cap that halves on throttling and grows by 1/limit per success (AIMD)."""
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit / 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def _classify(e):
+    """(retriable, throttled) for a Maps client error."""
+    if isinstance(e, ApiError):
+        if e.status in _THROTTLED_STATUSES and any(h in (e.message or "").lower() for h in _DAILY_QUOTA_HINTS):
+            # Fail at once and leave the concurrency limit alone: every later call fails the same way
+            return False, False
+        throttled = e.status in _THROTTLED_STATUSES
+        return throttled or e.status == "UNKNOWN_ERROR", throttled
+    if isinstance(e, HTTPError):
+        return e.status_code in _RETRIABLE_HTTP, e.status_code == 429
+    return isinstance(e, (Timeout, TransportError)), False
+
+
+class ThrottledClient:
+    """Wraps a googlemaps.Client (or a stand-in); one instance is shared by every search.
+
+    Each call waits for its API's bucket and a concurrency slot, and is retried on its own
+    with full-jitter exponential backoff, so one throttled page or matrix block doesn't
+    fail or repeat the rest of the search.
+    """
+
+    def __init__(self, gmaps, rates=API_RATES, max_in_flight=API_MAX_IN_FLIGHT):
+        self._gmaps = gmaps
+        self.buckets = {api: TokenBucket(*rate) for api, rate in rates.items()}
+        self.limits = {api: AdaptiveLimit(n) for api, n in max_in_flight.items()}
+        self.retries = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _call(self, api, cost, *args, **kwargs):
+        for attempt in range(MAX_ATTEMPTS):
+            self.buckets[api].take(cost)
+            self.limits[api].acquire()
+            throttled = False
+            try:
+                return getattr(self._gmaps, api)(*args, **kwargs)
+            except (ApiError, TransportError, Timeout) as e:
+                retriable, throttled = _classify(e)
+                if not retriable or attempt == MAX_ATTEMPTS - 1:
+                    raise
+            finally:
+                self.limits[api].release(throttled)
+            with self._lock:
+                self.retries += 1
+                self.throttled += throttled
+            time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+    def geocode(self, address):
+        return self._call("geocode", 1, address)
+
+    def place(self, place_id, **kwargs):
+        return self._call("place", 1, place_id, **kwargs)
+
+    def places_autocomplete(self, input_text, **kwargs):
+        return self._call("places_autocomplete", 1, input_text, **kwargs)
+
+    def places_nearby(self, **kwargs):
+        return self._call("places_nearby", 1, **kwargs)
+
+    def distance_matrix(self, origins, destinations, **kwargs):
+        return self._call("distance_matrix", len(origins) * len(destinations),
+                          origins=origins, destinations=destinations, **kwargs)
+
+    def preconnect(self):
+        """Opens a pooled keep-alive connection to the Maps host before the first request needs it."""
+        session = getattr(self._gmaps, "session", None)
+        if session is not None:
+            # A bare HEAD on the host is not an API call, so it costs no quota
+            session.head(self._gmaps.base_url, timeout=5)
+
+    def stats(self):
+        return {"retries": self.retries, "throttled": self.throttled,
+                "limits": {api: int(limit.limit) for api, limit in self.limits.items()}}
+
+
+class _SingleAttemptClient(googlemaps.Client):
+    """A googlemaps.Client that raises on the 5xx responses it would otherwise retry itself."""
+
+    def _request(self, url, params, first_request_time=None, retry_counter=0, *args, **kwargs):
+        if retry_counter:
+            # Only a 500, 503 or 504 brings the client back here; all three are retriable
+            # and not throttling to ThrottledClient, which retries with its own backoff
+            raise HTTPError(503)
+        return super()._request(url, params, first_request_time, retry_counter, *args, **kwargs)
+
+
+def pooled_client(api_key, queries_per_second=None):
+    """A googlemaps.Client on a keep-alive session pool, with its own retrying turned off.
+
+    ThrottledClient does the rate limiting and retrying: the client neither retries
+    OVER_QUERY_LIMIT nor 5xx responses, so attempts don't stack. Its global QPS cap is
+    only a backstop.
+    """
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE))
+    return _SingleAttemptClient(
+        key=api_key, requests_session=session, retry_over_query_limit=False,
+        queries_per_second=queries_per_second or 100,
+    )
+
+
+def make_client(api_key, queries_per_second=None):
+    return ThrottledClient(pooled_client(api_key, queries_per_second))
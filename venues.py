@@ -0,0 +1,118 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from cache import CACHE_DIR
+from geo import EARTH_RADIUS_M, cells_in_circle, haversine
+
+# Coverage is tracked per grid cell of this size (metres) and Places keyword
+VENUE_CELL_M = 150
+# How long a cell's Places answer counts as fresh
+VENUE_TTL = 7 * 24 * 3600
+# Places stops at 3 pages of 20; a search that hit the cap may have missed venues
+PLACES_RESULT_CAP = 60
+
+
+def _term(keyword):
+    return keyword or "*"
+
+
+class VenueIndex:
+    """Every venue Places has returned, on SQLite with a lat/lng range index.
+
+    Coverage records when each (grid cell, keyword) was last fully answered by Places, so
+    a search circle whose cells are all fresh can be served from the index instead.
+    """
+
+    def __init__(self, path=None, ttl=VENUE_TTL, cell_m=VENUE_CELL_M):
+        self.ttl = ttl
+        self.cell_m = cell_m
+        self._lock = threading.Lock()
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "venues.sqlite3")
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS venues ("
+            "place_id TEXT PRIMARY KEY, name TEXT, rating REAL, lat REAL, lng REAL, updated REAL);"
+            "CREATE INDEX IF NOT EXISTS venues_lat_lng ON venues (lat, lng);"
+            "CREATE TABLE IF NOT EXISTS venue_terms (place_id TEXT, term TEXT, PRIMARY KEY (place_id, term));"
+            "CREATE TABLE IF NOT EXISTS coverage ("
+            "row INTEGER, col INTEGER, term TEXT, fetched REAL, PRIMARY KEY (row, col, term));"
+        )
+
+    def covered(self, circle, keyword):
+        """True when every cell in the circle was answered by Places for keyword within the TTL."""
+        cells = cells_in_circle(circle.location, circle.radius, self.cell_m)
+        if not cells:
+            return False
+        since = time.time() - self.ttl
+        with self._lock:
+            fresh = 0
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(cells), 200):
+                batch = cells[i:i + 200]
+                marks = " OR ".join("(row = ? AND col = ?)" for _ in batch)
+                (n,) = self._db.execute(
+                    f"SELECT COUNT(*) FROM coverage WHERE term = ? AND fetched >= ? AND ({marks})",
+                    [_term(keyword), since] + [v for cell in batch for v in cell],
+                ).fetchone()
+                fresh += n
+        return fresh == len(cells)
+
+    def query(self, circle, keyword):
+        """Indexed venues for keyword within the circle, shaped like Places results."""
+        dlat = math.degrees(circle.radius / EARTH_RADIUS_M)
+        dlng = dlat / math.cos(math.radians(circle.location['lat']))
+        lat, lng = circle.location['lat'], circle.location['lng']
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT v.place_id, v.name, v.rating, v.lat, v.lng FROM venues v "
+                "JOIN venue_terms t ON t.place_id = v.place_id "
+                "WHERE t.term = ? AND v.lat BETWEEN ? AND ? AND v.lng BETWEEN ? AND ? AND v.updated >= ?",
+                # Venues Places stopped returning (e.g. closed) age out with the TTL
+                (_term(keyword), lat - dlat, lat + dlat, lng - dlng, lng + dlng, time.time() - self.ttl),
+            ).fetchall()
+        if not rows:
+            return []
+        inside = haversine(lat, lng, np.array([r[3] for r in rows]), np.array([r[4] for r in rows])) <= circle.radius
+        return [
+            {"place_id": r[0], "name": r[1], "rating": r[2], "geometry": {"location": {"lat": r[3], "lng": r[4]}}}
+            for r, ok in zip(rows, inside) if ok
+        ]
+
+    def add(self, venues, keyword):
+        """Upserts venues from a Places page and tags them with the keyword they matched."""
+        now = time.time()
+        rows = [(v['place_id'], v['name'], v.get('rating', 0),
+                 v['geometry']['location']['lat'], v['geometry']['location']['lng'], now) for v in venues]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO venues VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.executemany("INSERT OR IGNORE INTO venue_terms VALUES (?, ?)",
+                                 [(v['place_id'], _term(keyword)) for v in venues])
+
+    def warm(self):
+        """Primes the OS page cache with the venue and coverage tables and the location index;
+        returns the venue count.
+
+        The sums are over columns no index holds, so SQLite has to read every table page
+        rather than answer from an index. Nothing is kept in process.
+        """
+        with self._lock:
+            n, _ = self._db.execute("SELECT COUNT(*), SUM(LENGTH(name) + rating) FROM venues").fetchone()
+            self._db.execute("SELECT COUNT(*) FROM venues WHERE lat > -91").fetchone()
+            self._db.execute("SELECT SUM(fetched) FROM coverage").fetchone()
+        return n
+
+    def mark_covered(self, circle, keyword):
+        """Records that Places returned everything it has for keyword inside the circle."""
+        now = time.time()
+        cells = cells_in_circle(circle.location, circle.radius, self.cell_m)
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?)",
+                                 [(row, col, _term(keyword), now) for row, col in cells])
@@ -0,0 +1,167 @@
+"""Warm start after a (re)deploy: heavy imports, OS page-cache priming for the SQLite
+caches, the Maps connection and a Places prefetch of the areas searched most in the recent
+query log, run in the background with readiness reporting.
+
+    python warmup.py [--budget 50] [--days 7]
+
+runs the same steps once in the foreground (key from --key or $GMAPS_API_KEY).
+"""
+import argparse
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from engine import search_plan
+from metrics import SearchMetrics, log_search, quota_burn, recent_queries
+from search import MAX_PAGES, stream_places
+
+log = logging.getLogger(__name__)
+
+# Most Places requests prefetching may spend per day, however often the app restarts
+PREFETCH_BUDGET = int(os.environ.get("MEETUP_PREFETCH_BUDGET", 50))
+# How far back the query log is read
+PREFETCH_DAYS = 7
+# Most recently used entries per cache whose pages are primed
+PRIME_ENTRIES = 20000
+
+# Imported lazily by the app, so the first render would otherwise pay for them
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow", "pydeck")
+
+STEPS = ("imports", "caches", "client", "prefetch")
+# The steps the first search benefits from at once; prefetch keeps going after
+CORE_STEPS = ("imports", "caches", "client")
+
+
+def popular_jobs(days=PREFETCH_DAYS):
+    """[(circle, term)] Places jobs of the searches in the recent query log, most searched first.
+
+    Each logged search is planned again exactly as triangulate_stream plans it, so a
+    prefetched job is the one the next identical search asks the venue index about.
+    """
+    counts, jobs = Counter(), {}
+    for query in recent_queries(days):
+        _, plan = search_plan(query["origins"], query["max_mins"])
+        for circle in plan.circles:
+            for term in query["terms"]:
+                key = (round(circle.location['lat'], 6), round(circle.location['lng'], 6), round(circle.radius), term)
+                jobs.setdefault(key, (circle, term))
+                counts[key] += 1
+    return [jobs[key] for key, _ in counts.most_common()]
+
+
+def prefetch(gmaps, venue_index, budget=PREFETCH_BUDGET, days=PREFETCH_DAYS):
+    """Runs the popular Places jobs the venue index doesn't cover fresh, within what is left
+    of today's budget of Places requests; returns the requests spent.
+
+    The usage is logged like a search, as kind "prefetch", so it counts towards quota burn
+    and towards the budget of every later warm-up that day.
+    """
+    left = budget - quota_burn(kind="prefetch").get("places", {}).get("requests", 0)
+    metrics = SearchMetrics(kind="prefetch")
+    gmaps = metrics.client(gmaps)
+    spent = 0
+    try:
+        for circle, term in popular_jobs(days):
+            if spent + MAX_PAGES > left:
+                break
+            if venue_index.covered(circle, term):
+                continue
+            # A crowded circle is tiled (see stream_places) with whatever the budget has left
+            tiles = (left - spent - MAX_PAGES) // MAX_PAGES
+            with metrics.stage("places"):
+                for _ in stream_places(gmaps, [(circle, term)], index=venue_index, max_tile_jobs=tiles):
+                    pass
+            spent = metrics.api.get("places_nearby", {}).get("requests", 0)
+    finally:
+        if metrics.api:
+            log_search(metrics)
+    return spent
+
+
+class Warmup:
+    """Runs the warm-up steps on a background thread and reports how far they got.
+
+    status maps each step to "pending", "running", "done ..." or "failed: ..."; a failed
+    step only costs its own warmth, never the app.
+    """
+
+    def __init__(self):
+        self.status = dict.fromkeys(STEPS, "pending")
+        self.started = time.time()
+        self.ready_at = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return all(self.status[step] not in ("pending", "running") for step in CORE_STEPS)
+
+    def _step(self, name, fn):
+        self.status[name] = "running"
+        start = time.perf_counter()
+        try:
+            detail = fn()
+            self.status[name] = f"done in {time.perf_counter() - start:.1f} s" + (f" ({detail})" if detail else "")
+        except Exception as e:
+            log.warning("warm-up step %s failed: %s", name, e)
+            self.status[name] = f"failed: {e}"
+        if self.ready_at is None and self.ready:
+            self.ready_at = time.time()
+            log.info("warm-up ready after %.1f s", self.ready_at - self.started)
+
+    def run(self, gmaps=None, caches=(), venue_index=None, budget=PREFETCH_BUDGET, days=PREFETCH_DAYS):
+        def imports():
+            for name in HEAVY_MODULES:
+                importlib.import_module(name)
+
+        def prime():
+            entries = sum(cache.warm(PRIME_ENTRIES) for cache in caches)
+            venues = venue_index.warm() if venue_index is not None else 0
+            return f"{entries} cache entries, {venues} venues"
+
+        def connect():
+            if gmaps is None:
+                return "no API key"
+            gmaps.preconnect()
+
+        def fetch():
+            if gmaps is None or venue_index is None or budget <= 0:
+                return "skipped"
+            return f"{prefetch(gmaps, venue_index, budget, days)} requests (daily budget {budget})"
+
+        self._step("imports", imports)
+        self._step("caches", prime)
+        self._step("client", connect)
+        self._step("prefetch", fetch)
+        return self
+
+    def start(self, **kwargs):
+        self._thread = threading.Thread(target=self.run, kwargs=kwargs, name="warmup", daemon=True)
+        self._thread.start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--key", default=os.environ.get("GMAPS_API_KEY"))
+    parser.add_argument("--budget", type=int, default=PREFETCH_BUDGET, help="most Places requests to prefetch with per day")
+    parser.add_argument("--days", type=int, default=PREFETCH_DAYS, help="how far back to read the query log")
+    args = parser.parse_args(argv)
+
+    from cache import open_geocode_cache, open_walk_cache
+    from throttle import make_client
+    from venues import VenueIndex
+
+    warmup = Warmup().run(
+        make_client(args.key) if args.key else None, [open_geocode_cache(), open_walk_cache()], VenueIndex(),
+        args.budget, args.days,
+    )
+    for step, status in warmup.status.items():
+        print(f"{step:<9} {status}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()